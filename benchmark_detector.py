@@ -0,0 +1,72 @@
+import time
+import json
+import argparse
+from itertools import islice
+from config import DEFAULT_MODEL
+from detection import extract_detections_batch, use_model
+from frame_source import open_source
+from models import MODEL_LOADERS, preload, set_num_threads
+from synthetic import SyntheticScene
+
+# Detector throughput against batch size. The detection cache is never enabled here, so
+# every frame goes through the network.
+
+
+def measure(frames, batch_size, repeat):
+    # one warm-up batch: the first call of a batch shape pays for allocations
+    extract_detections_batch(frames[:batch_size], batch_size=batch_size)
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for start in range(0, len(frames), batch_size):
+            extract_detections_batch(frames[start:start + batch_size], batch_size=batch_size)
+        runs.append(time.perf_counter() - started)
+    best = min(runs)
+    return {'batch_size': batch_size, 'frames': len(frames), 'seconds': best,
+            'fps': len(frames) / best, 'ms_per_frame': 1000 * best / len(frames)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость детектора в зависимости от размера батча")
+    parser.add_argument('--source', type=str, default=None,
+                        help="Видео или папка кадров (по умолчанию — синтетическая сцена)")
+    parser.add_argument('--frames', type=int, default=64,
+                        help="Сколько кадров прогонять через детектор")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help="Размеры батча")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Число прогонов на размер батча (берётся лучший)")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Потоков torch для инференса")
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL, choices=sorted(MODEL_LOADERS),
+                        help="Модель детектора")
+    parser.add_argument('--weights', type=str, default=None,
+                        help="Локальный файл весов модели")
+    parser.add_argument('--hub-repo', type=str, default=None,
+                        help="Локальная копия репозитория ultralytics/yolov5 для torch.hub")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    if args.source is None:
+        frames = SyntheticScene(640, 480).frames(args.frames)
+    else:
+        frames = list(islice(open_source(args.source), args.frames))
+    set_num_threads(args.threads)
+    use_model(args.model, weights=args.weights, repo=args.hub_repo)
+    preload(args.model)
+
+    results = []
+    print(f"{'Батч':>5} {'Кадр/с':>8} {'мс/кадр':>8} {'Ускорение':>10}")
+    for batch_size in args.batch_sizes:
+        result = measure(frames, batch_size, args.repeat)
+        results.append(result)
+        print(f"{batch_size:>5} {result['fps']:>8.1f} {result['ms_per_frame']:>8.1f} "
+              f"{result['fps'] / results[0]['fps']:>9.2f}x")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import platform
+from datetime import datetime, timezone
+import numpy as np
+from skimage.color import rgb2gray
+from cross_correlation import CorrelationTracker
+from detection import draw_detections, rectangle
+from metrics import iou_matrix, iou_score, motp_mota
+from synthetic import SyntheticScene, noisy_tracks
+from tracker import Tracker
+
+# Micro-benchmarks of the tracker hot paths on seeded synthetic scenes: no network, no
+# model, no video files. Results can be saved as a baseline and later runs are compared
+# against it, cases slower than the baseline by more than --threshold are flagged.
+
+
+def measure(run, repeat=5, min_time=0.05):
+    # calibrates the loop count so one sample takes at least min_time, returns seconds per call
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= max(2, int(min_time / max(elapsed, 1e-9)))
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - started) / number)
+    return {'median_ms': 1000 * float(np.median(samples)), 'min_ms': 1000 * min(samples), 'loops': number}
+
+
+def dense_scene(num_objects, width, height, seed):
+    # object sizes follow the frame so that many boxes still fit
+    size = max(8, int(np.sqrt(width * height / num_objects) / 2))
+    return SyntheticScene(width, height, num_objects=num_objects, seed=seed,
+                          min_size=size // 2, max_size=size, max_speed=3.0)
+
+
+def iou_cases():
+    scene = dense_scene(100, 1280, 720, seed=0)
+    boxes = scene.boxes(0)[:, 1:].tolist()
+    pairs = list(zip(boxes, boxes[1:] + boxes[:1]))
+
+    def pairwise():
+        for bbox1, bbox2 in pairs:
+            iou_score(bbox1, bbox2)
+
+    yield 'iou_score/100_pairs', pairwise
+    for count in (10, 100, 1000):
+        scene = dense_scene(count, 1920, 1080, seed=count)
+        a, b = scene.boxes(0)[:, 1:], scene.boxes(1)[:, 1:]
+        yield f'iou_matrix/{count}x{count}', lambda a=a, b=b: iou_matrix(a, b)
+
+
+def bind_cases():
+    for count in (10, 100, 1000):
+        scene = dense_scene(count, 1920, 1080, seed=count)
+        for matcher in ('greedy', 'hungarian'):
+            tracker = Tracker(return_images=False, matcher=matcher)
+            tracker.append_history(scene.boxes(0))
+            tracker.frame_index = 1
+            detections = scene.boxes(1)
+            detections[:, 0] = 0
+            yield f'bind_tracklet/{matcher}/{count}', lambda tracker=tracker, detections=detections: \
+                tracker.bind_tracklet(detections)
+
+
+def build_cases():
+    for width, height in ((320, 240), (640, 480), (1280, 720)):
+        for count in (5, 20, 50):
+            scene = dense_scene(count, width, height, seed=count)
+            tracker = CorrelationTracker(return_images=False)
+            tracker.prev_gray = rgb2gray(scene.frame(0))
+            tracker.append_history(scene.boxes(0))
+            tracker.frame_index = 1
+            frame = scene.frame(1)
+            gray = rgb2gray(frame)
+            yield f'build_tracklet/{width}x{height}/{count}', \
+                lambda tracker=tracker, frame=frame, gray=gray: tracker.build_tracklet(frame, gray)
+
+
+def draw_cases():
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    yield 'rectangle/200x300', lambda: rectangle(frame.shape, (100, 200), (300, 500))
+    for count in (10, 100):
+        detections = dense_scene(count, 1280, 720, seed=count).boxes(0)
+        out = np.empty_like(frame)
+        yield f'draw_detections/1280x720/{count}', \
+            lambda detections=detections, out=out: draw_detections(frame, detections, out=out)
+
+
+def metrics_cases():
+    for num_frames, count in ((1000, 20), (5000, 20), (1000, 100)):
+        scene = dense_scene(count, 1920, 1080, seed=num_frames + count)
+        ground_truth = [scene.boxes(frame_index) for frame_index in range(num_frames)]
+        hypotheses = noisy_tracks(scene, num_frames, seed=1)
+        yield f'motp_mota/{num_frames}_frames/{count}', \
+            lambda ground_truth=ground_truth, hypotheses=hypotheses: motp_mota(ground_truth, hypotheses)
+
+
+CASE_GROUPS = (iou_cases, bind_cases, build_cases, draw_cases, metrics_cases)
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_cases(patterns, repeat, min_time):
+    results = {}
+    for group in CASE_GROUPS:
+        for name, run in group():
+            if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                continue
+            results[name] = measure(run, repeat, min_time)
+            print(f"{name:<36} {results[name]['median_ms']:>10.3f} мс")
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'Кейс':<36} {'База мс':>10} {'Сейчас мс':>10} {'Изм.':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        # the fastest sample is the least disturbed by other load on the machine
+        ratio = result['min_ms'] / base['min_ms']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  РЕГРЕССИЯ'
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = '  ускорение'
+        print(f"{name:<36} {base['min_ms']:>10.3f} {result['min_ms']:>10.3f} {ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих участков трекера на синтетических сценах")
+    parser.add_argument('--filter', type=str, nargs='+', default=None,
+                        help="Шаблоны имён кейсов, например 'bind_tracklet/*'")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Число замеров на кейс (для сравнения берётся лучший)")
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help="Минимальная длительность одного замера (с)")
+    parser.add_argument('--baseline', type=str, default='hotpaths_baseline.json',
+                        help="Файл базовых результатов")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Сохранить результаты как базовые (обновляет только измеренные кейсы)")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Допустимое замедление относительно базы (0.2 = 20%%)")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Сохранить результаты этого запуска в JSON")
+    args = parser.parse_args()
+
+    results = run_cases(args.filter, args.repeat, args.min_time)
+    report = {'created': datetime.now(timezone.utc).isoformat(), 'environment': environment(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+            stored['results'].update(results)
+            results = stored['results']
+        report['results'] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nБазовые результаты сохранены в {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get('environment') != report['environment']:
+            print("\nВнимание: база снята в другом окружении, сравнение может быть неточным")
+        regressions = compare(results, stored['results'], args.threshold)
+        if regressions:
+            print(f"\nРегрессии ({len(regressions)}): {', '.join(regressions)}")
+        else:
+            print("\nРегрессий нет")
+    else:
+        print(f"\nБаза {args.baseline} не найдена, запустите с --save-baseline")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
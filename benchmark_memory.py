@@ -0,0 +1,104 @@
+import sys
+import time
+import json
+import argparse
+import resource
+import numpy as np
+from detection_provider import DetectionProvider
+from synthetic import SyntheticScene
+from tracker import Tracker
+
+# Long-run memory check of the track store: an IoU tracker is fed a synthetic stream in which
+# objects keep disappearing for longer than the store window and coming back as new tracks.
+# Once the ring has wrapped and the number of live tracks has peaked, the store's arrays, its
+# slot bookkeeping and the process peak RSS must stay put for the rest of the run.
+
+
+class ChurningDetections(DetectionProvider):
+    # true boxes of the scene; object k is hidden for `hidden` frames out of every
+    # `period * hidden`, staggered so that some identity is always being retired
+    def __init__(self, scene, hidden=200, period=7):
+        super().__init__()
+        self.scene = scene
+        self.hidden = hidden
+        self.period = period
+        self.objects = np.arange(len(scene.sizes))
+
+    def detect(self, frame, min_confidence, labels):
+        boxes = self.scene.boxes(self.frame_index)
+        visible = (self.frame_index // self.hidden + self.objects) % self.period != 0
+        boxes = boxes[visible]
+        boxes[:, 0] = 0
+        return boxes
+
+
+def footprint(tracker):
+    store = tracker.store
+    return {
+        'store_bytes': int(store.nbytes()),
+        'track_slots': len(store.slots) + len(store.free_slots),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка постоянства памяти хранилища треков на длинном потоке")
+    parser.add_argument('--hours', type=float, default=1.0,
+                        help="Длительность потока в часах (24 — суточный прогон)")
+    parser.add_argument('--fps', type=float, default=25,
+                        help="Частота кадров потока")
+    parser.add_argument('--objects', type=int, default=20,
+                        help="Число объектов в сцене")
+    parser.add_argument('--window', type=int, default=80,
+                        help="Окно хранилища треков (lookup_tail_size), кадров")
+    parser.add_argument('--checkpoints', type=int, default=10,
+                        help="Сколько раз замерять память за прогон")
+    parser.add_argument('--rss-tolerance-mb', type=float, default=4,
+                        help="Допустимый рост пикового RSS после прогрева (МБ)")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Сохранить замеры в JSON")
+    args = parser.parse_args()
+
+    num_frames = int(args.hours * 3600 * args.fps)
+    scene = SyntheticScene(1920, 1080, num_objects=args.objects, seed=0, min_size=40, max_size=160)
+    detector = ChurningDetections(scene)
+    tracker = Tracker(return_images=False, detector=detector, lookup_tail_size=args.window)
+    # warm-up: the ring wraps and every object has been hidden and re-found at least once
+    warm_up = max(10 * args.window, detector.hidden * detector.period)
+    step = max(1, (num_frames - warm_up) // args.checkpoints)
+
+    samples = []
+    started = time.perf_counter()
+    for frame_index in range(num_frames):
+        tracker.update_frame(frame_index)
+        if frame_index + 1 >= warm_up and (frame_index + 1 - warm_up) % step == 0:
+            sample = footprint(tracker)
+            sample.update({'frame': frame_index + 1, 'tracks_created': tracker.tracklet_count})
+            samples.append(sample)
+            print(f"{frame_index + 1:>10} кадров: хранилище {sample['store_bytes'] / 1024:>8.1f} КБ, "
+                  f"слотов {sample['track_slots']:>5}, треков создано {sample['tracks_created']:>7}, "
+                  f"пиковый RSS {sample['max_rss_kb'] / 1024:>7.1f} МБ")
+    elapsed = time.perf_counter() - started
+    print(f"\n{num_frames} кадров ({args.hours:g} ч при {args.fps:g} кадр/с) за {elapsed:.1f} с, "
+          f"{num_frames / elapsed:.0f} кадр/с")
+
+    first, last = samples[0], samples[-1]
+    failures = []
+    if last['store_bytes'] != first['store_bytes']:
+        failures.append(f"хранилище выросло с {first['store_bytes']} до {last['store_bytes']} байт")
+    if last['track_slots'] != first['track_slots']:
+        failures.append(f"слотов треков стало {last['track_slots']} вместо {first['track_slots']}")
+    rss_growth = (last['max_rss_kb'] - first['max_rss_kb']) / 1024
+    if rss_growth > args.rss_tolerance_mb:
+        failures.append(f"пиковый RSS вырос на {rss_growth:.1f} МБ")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'frames': num_frames, 'seconds': elapsed, 'samples': samples}, f, indent=2)
+    if failures:
+        print("ПАМЯТЬ РАСТЁТ: " + "; ".join(failures))
+        sys.exit(1)
+    print("Память после прогрева постоянна")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from metrics import MOTAccumulator
+from evalution_mot import find_sequences, parse_mot_gt, read_seqinfo
+from config import DEFAULT_MODEL
+from detection_provider import mot_detections, seek
+from frame_source import ImageSequenceSource
+from models import MODEL_LOADERS
+
+TRACKER_VARIANTS = {
+    'greedy': {},
+    'hungarian': {'matcher': 'hungarian'},
+    'full_frame': {'search_scale': None},
+    'adaptive': {'scheduler': 'adaptive'},
+    # constant-velocity prediction lets the correlation search shrink
+    'kalman': {'motion': 'kalman'},
+    'kalman_tight': {'motion': 'kalman', 'search_scale': 0.3},
+    # boxes can grow or shrink between detections; templates refresh only on good matches
+    'multiscale': {'scales': (0.9, 1.0, 1.1)},
+    'multiscale_cached': {'scales': (0.9, 1.0, 1.1), 'template_threshold': 0.5},
+    # detection on every frame and IoU association only, no correlation step
+    'iou': {'tracker': 'iou'},
+    'iou_hungarian': {'tracker': 'iou', 'matcher': 'hungarian'},
+    'iou_kalman': {'tracker': 'iou', 'motion': 'kalman'},
+}
+DETECTION_SOURCES = ('network', 'public')
+
+
+class CountingDetector:
+    def __init__(self, detect):
+        self.detect = detect
+        self.calls = 0
+
+    def __call__(self, frame, **kwargs):
+        self.calls += 1
+        return self.detect(frame, **kwargs)
+
+    def seek(self, frame_index):
+        seek(self.detect, frame_index)
+
+    @property
+    def source_coordinates(self):
+        return getattr(self.detect, 'source_coordinates', False)
+
+
+def init_worker(cache_dir, num_threads, model_name=DEFAULT_MODEL, weights=None, repo=None,
+                load_model=True):
+    # the model is loaded here once per worker process, not once per job
+    if not load_model:
+        return
+    import detection
+    import models
+    models.set_num_threads(num_threads)
+    detection.use_model(model_name, weights=weights, repo=repo)
+    models.preload(model_name)
+    if cache_dir:
+        detection.enable_detection_cache(cache_dir)
+
+
+def make_tracker(variant, detection_rate, detector, process_scale=1.0):
+    from cross_correlation import CorrelationTracker
+    from tracker import Tracker
+
+    options = dict(TRACKER_VARIANTS[variant])
+    if options.pop('tracker', 'correlation') == 'iou':
+        return Tracker(return_images=False, detector=detector, process_scale=process_scale, **options)
+    return CorrelationTracker(detection_rate=detection_rate, return_images=False,
+                              detector=detector, process_scale=process_scale, **options)
+
+
+def run_job(seq_path, detection_rate, variant, frame_cache_dir=None, detection_source='network',
+            det_min_confidence=None, process_scale=1.0):
+    info = read_seqinfo(seq_path)
+    ground_truth = parse_mot_gt(os.path.join(seq_path, 'gt', 'gt.txt'))
+
+    if detection_source == 'public':
+        detector = mot_detections(seq_path, min_confidence=det_min_confidence)
+    else:
+        from detection import extract_detections
+        detector = CountingDetector(extract_detections)
+    tracker = make_tracker(variant, detection_rate, detector, process_scale)
+    if detection_source == 'public' and TRACKER_VARIANTS[variant].get('tracker') == 'iou':
+        # nothing reads the pixels, so the images are not decoded at all
+        source = range(len(ground_truth))
+    else:
+        source = ImageSequenceSource(os.path.join(seq_path, info['imdir']), extension=info['imext'],
+                                     cache_dir=frame_cache_dir)
+    accumulator = MOTAccumulator(threshold=0.5)
+    latencies = []
+    for frame_num, frame in zip(range(len(ground_truth)), source):
+        started = time.perf_counter()
+        detections = tracker.update_frame(frame)
+        latencies.append(time.perf_counter() - started)
+        accumulator.update(ground_truth[frame_num], detections)
+
+    latencies = np.array(latencies) * 1000
+    result = {'sequence': info['name'], 'detection_rate': detection_rate, 'variant': variant,
+              'detection_source': detection_source, 'det_min_confidence': det_min_confidence,
+              'process_scale': process_scale}
+    result.update(accumulator.compute())
+    result.update({
+        'detector_calls': detector.calls,
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p95_ms': float(np.percentile(latencies, 95)),
+        'latency_p99_ms': float(np.percentile(latencies, 99)),
+        'tracker_fps': float(1000 * len(latencies) / latencies.sum()),
+    })
+    return result
+
+
+def run_benchmark(root, rates, variants, workers=None, cache_dir='.detection_cache', threads_per_worker=1,
+                  frame_cache_dir=None, model_name=DEFAULT_MODEL, weights=None, repo=None,
+                  detection_source='network', det_min_confidences=(None,), process_scales=(1.0,)):
+    if detection_source != 'public':
+        det_min_confidences = (None,)
+    jobs = [(seq_path, rate, variant, frame_cache_dir, detection_source, det_min_confidence, process_scale)
+            for seq_path in find_sequences(root) for rate in rates for variant in variants
+            for det_min_confidence in det_min_confidences for process_scale in process_scales]
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    context = multiprocessing.get_context('spawn')
+    initargs = (cache_dir, threads_per_worker, model_name, weights, repo, detection_source != 'public')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=initargs) as executor:
+        futures = [executor.submit(run_job, *job) for job in jobs]
+        results = []
+        for future in futures:
+            result = future.result()
+            print(f"{result['sequence']:<16} rate={result['detection_rate']:<3} {result['variant']:<11} "
+                  f"scale={result['process_scale']:<5} MOTA={result['mota']:.4f} MOTP={result['motp']:.4f} "
+                  f"p50={result['latency_p50_ms']:.1f}ms fps={result['tracker_fps']:.0f}")
+            results.append(result)
+    return results
+
+
+def compare_to_baseline(results, baseline='greedy'):
+    def key(result):
+        return (result['sequence'], result['detection_rate'], result['detection_source'],
+                result['det_min_confidence'], result['process_scale'])
+
+    reference = {key(result): result for result in results if result['variant'] == baseline}
+    for result in results:
+        base = reference.get(key(result))
+        if base is None or result['variant'] == baseline:
+            continue
+        result['detector_calls_saved'] = base['detector_calls'] - result['detector_calls']
+        result['mota_delta'] = result['mota'] - base['mota']
+        result['latency_ratio'] = result['latency_p50_ms'] / base['latency_p50_ms']
+        print(f"{result['sequence']:<16} rate={result['detection_rate']:<3} {result['variant']:<11} "
+              f"vs {baseline}: вызовов детектора {result['detector_calls']} "
+              f"(сэкономлено {result['detector_calls_saved']}), ΔMOTA={result['mota_delta']:+.4f}, "
+              f"задержка x{result['latency_ratio']:.2f}")
+    return results
+
+
+def write_results(results, output_path):
+    if output_path.endswith('.csv'):
+        with open(output_path, 'w', newline='') as f:
+            fieldnames = list(dict.fromkeys(key for result in results for key in result))
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(output_path, 'w') as f:
+            json.dump({'created': datetime.now(timezone.utc).isoformat(), 'results': results}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк трекера на последовательностях MOT15")
+    parser.add_argument('--root', type=str, default='data/MOT15/train',
+                        help="Папка с последовательностями (ищутся по seqinfo.ini)")
+    parser.add_argument('--rates', type=int, nargs='+', default=[1, 5, 10],
+                        help="Значения detection_rate")
+    parser.add_argument('--variants', type=str, nargs='+', default=['greedy'],
+                        choices=sorted(TRACKER_VARIANTS), help="Варианты трекера")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--threads', type=int, default=1,
+                        help="Потоков torch на процесс")
+    parser.add_argument('--cache-dir', type=str, default='.detection_cache',
+                        help="Папка кэша детекций ('' — без кэша)")
+    parser.add_argument('--frame-cache-dir', type=str, default=None,
+                        help="Папка для декодированных последовательностей (memmap .npy)")
+    parser.add_argument('--output', type=str, default='benchmark_results.json',
+                        help="Файл результатов (.json или .csv)")
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL, choices=sorted(MODEL_LOADERS),
+                        help="Модель детектора")
+    parser.add_argument('--weights', type=str, default=None,
+                        help="Локальный файл весов модели (без загрузки из сети)")
+    parser.add_argument('--hub-repo', type=str, default=None,
+                        help="Локальная копия репозитория ultralytics/yolov5 для torch.hub")
+    parser.add_argument('--detections', type=str, default='network', choices=DETECTION_SOURCES,
+                        help="Источник детекций: 'network' (нейросеть) или 'public' (det/det.txt, "
+                             "без загрузки модели)")
+    parser.add_argument('--det-min-confidence', type=float, nargs='+', default=[None],
+                        help="Пороги уверенности для det.txt (перебираются все значения)")
+    parser.add_argument('--process-scales', type=float, nargs='+', default=[1.0],
+                        help="Масштабы кадра для обработки, например 1.0 0.5 0.25 (перебираются все)")
+    parser.add_argument('--baseline', type=str, default='greedy', choices=sorted(TRACKER_VARIANTS),
+                        help="Вариант, с которым сравниваются остальные")
+    args = parser.parse_args()
+    results = run_benchmark(args.root, args.rates, args.variants, args.workers,
+                            args.cache_dir, args.threads, args.frame_cache_dir,
+                            args.model, args.weights, args.hub_repo,
+                            args.detections, args.det_min_confidence, args.process_scales)
+    compare_to_baseline(results, args.baseline)
+    write_results(results, args.output)
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES = ('metrics', 'track_store', 'frame_source', 'detection', 'tracker', 'cross_correlation', 'run')
+
+# every measurement runs in a fresh interpreter, so nothing is shared through sys.modules
+PROBE = '''
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'torch': 'torch' in sys.modules,
+                  'moviepy': 'moviepy' in sys.modules}}))
+'''
+
+
+def measure_import(module, repeat=5):
+    runs = []
+    for _ in range(repeat):
+        # the probe runs next to the modules, wherever the script was started from
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'module': module,
+        'median_ms': 1000 * statistics.median(run['seconds'] for run in runs),
+        'max_ms': 1000 * max(run['seconds'] for run in runs),
+        'imports_torch': runs[0]['torch'],
+        'imports_moviepy': runs[0]['moviepy'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта модулей трекера")
+    parser.add_argument('--modules', type=str, nargs='+', default=list(MODULES),
+                        help="Модули для замера")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Число запусков на модуль")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'Модуль':<18} {'Медиана мс':>11} {'Макс. мс':>9} {'torch':>6} {'moviepy':>8}")
+    for module in args.modules:
+        result = measure_import(module, args.repeat)
+        results.append(result)
+        print(f"{module:<18} {result['median_ms']:>11.1f} {result['max_ms']:>9.1f} "
+              f"{'да' if result['imports_torch'] else 'нет':>6} {'да' if result['imports_moviepy'] else 'нет':>8}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import time
+import json
+import asyncio
+import argparse
+from detection import detection_cast
+from multi_stream import MultiStreamTracker
+from synthetic import SyntheticScene
+
+
+class SyntheticDetector:
+    # returns the true boxes of the synthetic scenes and sleeps like an accelerator would:
+    # a fixed launch cost per batch plus a cost per frame, with the GIL released
+    def __init__(self, scenes, batch_overhead=0.03, frame_cost=0.004):
+        self.lookup = {}
+        for scene, frames in scenes:
+            for frame_index, frame in enumerate(frames):
+                self.lookup[id(frame)] = (scene, frame_index)
+        self.batch_overhead = batch_overhead
+        self.frame_cost = frame_cost
+        self.frames = 0
+
+    def __call__(self, frames, min_confidence=0.5, labels=None):
+        time.sleep(self.batch_overhead + self.frame_cost * len(frames))
+        self.frames += len(frames)
+        detections = []
+        for frame in frames:
+            scene, frame_index = self.lookup[id(frame)]
+            boxes = scene.boxes(frame_index)
+            boxes[:, 0] = 0
+            detections.append(detection_cast(boxes))
+        return detections
+
+
+async def feed(server, stream_id, frames):
+    for frame in frames:
+        await server.submit_frame(stream_id, frame)
+
+
+async def run_streams(server, streams):
+    await asyncio.gather(*(feed(server, stream_id, frames) for stream_id, frames in streams))
+
+
+def measure(num_streams, scenes, detect_batch, detection_rate, max_batch, max_latency, workers):
+    from cross_correlation import CorrelationTracker
+
+    server = MultiStreamTracker(lambda **kwargs: CorrelationTracker(detection_rate=detection_rate, **kwargs),
+                                detect_batch=detect_batch, max_batch=max_batch,
+                                max_latency=max_latency, workers=workers)
+    # streams cycle through the rendered scenes, every stream keeps its own tracker state
+    streams = [(stream_id, scenes[stream_id % len(scenes)][1]) for stream_id in range(num_streams)]
+    started = time.perf_counter()
+    try:
+        asyncio.run(run_streams(server, streams))
+    finally:
+        server.close()
+    wall = time.perf_counter() - started
+    stats = server.stats()
+    stats.update({'wall_s': wall, 'fps': stats['frames'] / wall, 'stream_fps': stats['frames'] / wall / num_streams,
+                  'detector_load': stats['detector_busy_s'] / wall})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк многопоточного трекинга с общим детектором")
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help="Число одновременных потоков")
+    parser.add_argument('--frames', type=int, default=60,
+                        help="Кадров в каждом потоке")
+    parser.add_argument('--scenes', type=int, default=4,
+                        help="Число различных синтетических сцен")
+    parser.add_argument('--rate', type=int, default=5,
+                        help="Как часто запускать детектор (раз в N кадров)")
+    parser.add_argument('--max-batch', type=int, default=16,
+                        help="Максимальный размер батча детектора")
+    parser.add_argument('--max-latency-ms', type=float, default=20,
+                        help="Максимальное ожидание сборки батча (мс)")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Потоков для шага корреляции")
+    parser.add_argument('--detector', type=str, default='synthetic', choices=['synthetic', 'network'],
+                        help="'synthetic' — истинные рамки с имитацией задержки, 'network' — нейросеть")
+    parser.add_argument('--batch-overhead-ms', type=float, default=30,
+                        help="Имитация детектора: фиксированная стоимость батча (мс)")
+    parser.add_argument('--frame-cost-ms', type=float, default=4,
+                        help="Имитация детектора: стоимость одного кадра в батче (мс)")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    scenes = []
+    for seed in range(args.scenes):
+        scene = SyntheticScene(seed=seed)
+        scenes.append((scene, scene.frames(args.frames)))
+    if args.detector == 'synthetic':
+        detect_batch = SyntheticDetector(scenes, args.batch_overhead_ms / 1000, args.frame_cost_ms / 1000)
+    else:
+        from detection import extract_detections_batch as detect_batch
+
+    results = []
+    print(f"{'Потоков':>8} {'Кадр/с':>8} {'На поток':>9} {'Батчей':>7} {'Ср. батч':>9} "
+          f"{'p50 мс':>8} {'p99 мс':>8} {'Загр. дет.':>10}")
+    for num_streams in args.streams:
+        stats = measure(num_streams, scenes, detect_batch, args.rate, args.max_batch,
+                        args.max_latency_ms / 1000, args.workers)
+        results.append(stats)
+        print(f"{num_streams:>8} {stats['fps']:>8.1f} {stats['stream_fps']:>9.1f} {stats['batches']:>7} "
+              f"{stats['mean_batch']:>9.1f} {stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f} "
+              f"{stats['detector_load']:>10.0%}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,6 @@
-import torch
-import torchvision
-
-model = torchvision.models.detection.ssd300_vgg16(
-    weights=torchvision.models.detection.SSD300_VGG16_Weights.DEFAULT
-)
-
-model.eval()
+DEFAULT_MODEL = 'yolov5s'
+DEFAULT_CONF = 0.5
+DEFAULT_IOU = 0.45
 
 COCO_INSTANCE_CATEGORY_NAMES = [
     '__background__', 'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus',
@@ -1,79 +1,312 @@
 import os
+from functools import lru_cache
+import cv2
 import numpy as np
+from scipy import fft
 from skimage.color import rgb2gray
 from skimage.feature import match_template
-from detection import detection_cast, draw_detections, extract_detections
+from detection import detection_cast
+from scheduling import frame_signals, make_scheduler, peak_sharpness
+from template_cache import TemplateCache
 from tracker import Tracker
-from moviepy.editor import VideoFileClip
 
 
 def gaussian(shape, x, y, dx, dy):
     Y, X = np.mgrid[0:shape[0], 0:shape[1]]
     return np.exp(-((X - x)**2) / dx**2 - ((Y - y)**2) / dy**2)
 
+def displacement(shift_x, shift_y, bbox_width, bbox_height):
+    return float(np.hypot(shift_x / max(bbox_width, 1), shift_y / max(bbox_height, 1)))
+
+@lru_cache(maxsize=1024)
+def gaussian_1d(length, center, sigma):
+    # one axis of the separable prior; a few KB per entry, shared by windows of any size
+    profile = np.exp(-((np.arange(length) - center)**2) / sigma**2)
+    profile.flags.writeable = False
+    return profile
+
+def gaussian_prior(shape, x, y, dx, dy):
+    # exp(-a - b) = exp(-a) * exp(-b): the window prior is the outer product of two cached
+    # axis profiles, so nothing window-sized is kept between frames
+    return np.multiply.outer(gaussian_1d(shape[0], y, dy), gaussian_1d(shape[1], x, dx))
+
+def search_window(frame_shape, center_x, center_y, bbox_width, bbox_height, search_scale):
+    # window of candidate template centers, clipped to the frame like the full-frame search
+    radius_x = max(1, int(np.ceil(search_scale * bbox_width)))
+    radius_y = max(1, int(np.ceil(search_scale * bbox_height)))
+    x0 = max(0, center_x - radius_x)
+    y0 = max(0, center_y - radius_y)
+    x1 = min(frame_shape[1], center_x + radius_x + 1)
+    y1 = min(frame_shape[0], center_y + radius_y + 1)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return y0, y1, x0, x1
+
+def clip_box(box, frame_shape):
+    height, width = frame_shape[:2]
+    xmin, ymin, xmax, ymax = box
+    return [min(max(xmin, 0), width), min(max(ymin, 0), height),
+            min(max(xmax, 0), width), min(max(ymax, 0), height)]
+
+def crop_padded(image, y0, y1, x0, x1):
+    # zero padding outside the frame reproduces match_template(..., pad_input=True)
+    crop = np.zeros((y1 - y0, x1 - x0), dtype=image.dtype)
+    sy0, sy1 = max(0, y0), min(image.shape[0], y1)
+    sx0, sx1 = max(0, x0), min(image.shape[1], x1)
+    if sy0 < sy1 and sx0 < sx1:
+        crop[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = image[sy0:sy1, sx0:sx1]
+    return crop
+
+def window_sum(image, shape):
+    integral = np.zeros((image.shape[0] + 1, image.shape[1] + 1))
+    np.cumsum(np.cumsum(image, axis=0), axis=1, out=integral[1:, 1:])
+    h, w = shape
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+def batched_ncc(images, templates):
+    # valid-mode normalized cross-correlation of every (image, template) pair in one FFT call
+    height = max(image.shape[0] for image in images)
+    width = max(image.shape[1] for image in images)
+    fft_shape = (fft.next_fast_len(height, True), fft.next_fast_len(width, True))
+    image_stack = np.zeros((len(images),) + fft_shape)
+    template_stack = np.zeros((len(images),) + fft_shape)
+    for k, (image, template) in enumerate(zip(images, templates)):
+        image_stack[k, :image.shape[0], :image.shape[1]] = image
+        template_stack[k, :template.shape[0], :template.shape[1]] = template - template.mean()
+    spectrum = fft.rfft2(image_stack, axes=(1, 2))
+    spectrum *= np.conj(fft.rfft2(template_stack, axes=(1, 2)))
+    xcorr = fft.irfft2(spectrum, s=fft_shape, axes=(1, 2))
+
+    responses = []
+    for k, (image, template) in enumerate(zip(images, templates)):
+        out_h = image.shape[0] - template.shape[0] + 1
+        out_w = image.shape[1] - template.shape[1] + 1
+        numerator = xcorr[k, :out_h, :out_w]
+        image_sum = window_sum(image, template.shape)
+        image_sum2 = window_sum(image ** 2, template.shape)
+        template_ssd = np.sum((template - template.mean()) ** 2)
+        denominator = (image_sum2 - image_sum ** 2 / template.size) * template_ssd
+        denominator = np.sqrt(np.maximum(denominator, 0))
+        response = np.zeros_like(numerator)
+        mask = denominator > np.finfo(np.float64).eps
+        response[mask] = numerator[mask] / denominator[mask]
+        responses.append(response)
+    return responses
+
 
 class CorrelationTracker(Tracker):
-    def __init__(self, detection_rate=5, **kwargs):
+    def __init__(self, detection_rate=5, search_scale=1.0, batch_size=16, scheduler=None,
+                 scales=(1.0,), template_threshold=None, **kwargs):
         super().__init__(**kwargs)
         self.detection_rate = detection_rate
-        self.prev_frame = None
+        self.search_scale = search_scale
+        self.batch_size = batch_size
+        # scale 1.0 goes first so that it wins ties against the resized templates
+        self.scales = tuple(sorted(scales, key=lambda scale: scale != 1.0))
+        self.template_threshold = template_threshold
+        self.templates = TemplateCache()
+        self.scheduler = make_scheduler(scheduler, detection_rate)
+        self.signals = None
+        self.prev_gray = None
+
+    def match_full_frame(self, gray_frame, template, center_x, center_y, bbox_width, bbox_height):
+        with self.profiler.stage('match_template'):
+            matching = match_template(gray_frame, template, pad_input=True)
+        with self.profiler.stage('gaussian'):
+            gauss = gaussian(matching.shape, center_x, center_y, bbox_width // 2, bbox_height // 2)
+        output = matching * gauss
+        best_y, best_x = np.unravel_index(np.argmax(output), output.shape)
+        return best_y, best_x, matching[best_y, best_x], peak_sharpness(output)
+
+    def match_windows(self, gray_frame, requests):
+        # requests: (template, (y0, y1, x0, x1), center_x, center_y, bbox_width, bbox_height)
+        crops = []
+        for template, (y0, y1, x0, x1), *_ in requests:
+            h, w = template.shape
+            crops.append(crop_padded(gray_frame, y0 - h // 2, y1 - 1 - h // 2 + h,
+                                     x0 - w // 2, x1 - 1 - w // 2 + w))
+
+        if self.batch_size is None:
+            with self.profiler.stage('match_template'):
+                responses = [match_template(crop, request[0]) for crop, request in zip(crops, requests)]
+        else:
+            responses = [None] * len(requests)
+            order = sorted(range(len(requests)), key=lambda k: crops[k].shape)
+            for start in range(0, len(order), self.batch_size):
+                chunk = order[start:start + self.batch_size]
+                with self.profiler.stage('match_template'):
+                    chunk_responses = batched_ncc([crops[k] for k in chunk],
+                                                  [requests[k][0] for k in chunk])
+                for k, response in zip(chunk, chunk_responses):
+                    responses[k] = response
+
+        best = []
+        for response, (template, (y0, y1, x0, x1), center_x, center_y,
+                       bbox_width, bbox_height) in zip(responses, requests):
+            with self.profiler.stage('gaussian'):
+                prior = gaussian_prior(response.shape, center_x - x0, center_y - y0,
+                                       bbox_width // 2, bbox_height // 2)
+            output = response * prior
+            best_y, best_x = np.unravel_index(np.argmax(output), response.shape)
+            best.append((y0 + best_y, x0 + best_x, response[best_y, best_x], peak_sharpness(output)))
+        return best
+
+    def track_template(self, label, gray_prev, xmin, ymin, xmax, ymax):
+        template = None
+        if self.template_threshold is not None:
+            template = self.templates.get(int(label))
+        if template is None:
+            return gray_prev[ymin:ymax, xmin:xmax], False
+        return template, True
+
+    def pyramid(self, template, cached, bbox_width, bbox_height, frame_shape):
+        # (template, box width, box height) per scale; a cached template may come from an
+        # earlier box size, so it is brought to the current box first. Levels that do not
+        # fit into the frame are skipped, match_template cannot place them
+        if cached and template.shape != (bbox_height, bbox_width) and bbox_width > 0 and bbox_height > 0:
+            template = cv2.resize(template, (bbox_width, bbox_height), interpolation=cv2.INTER_LINEAR)
+        levels = []
+        for scale in self.scales:
+            if scale == 1.0:
+                if template.shape[0] <= frame_shape[0] and template.shape[1] <= frame_shape[1]:
+                    levels.append((template, bbox_width, bbox_height))
+                continue
+            height = int(round(template.shape[0] * scale))
+            width = int(round(template.shape[1] * scale))
+            if height < 2 or width < 2 or height > frame_shape[0] or width > frame_shape[1]:
+                continue
+            levels.append((cv2.resize(template, (width, height), interpolation=cv2.INTER_LINEAR),
+                           int(round(bbox_width * scale)), int(round(bbox_height * scale))))
+        return levels
+
+    def level_box(self, best_x, best_y, level_width, level_height, frame_shape):
+        box = [best_x - level_width // 2, best_y - level_height // 2,
+               best_x + level_width // 2, best_y + level_height // 2]
+        if len(self.scales) > 1:
+            # an upscaled level can reach past the frame
+            box = clip_box(box, frame_shape)
+        return box
+
+    def update_template(self, label, gray_frame, template, box, peak):
+        # a confident match refreshes the template from the current frame, otherwise the
+        # last good one is kept
+        if self.template_threshold is None:
+            return
+        xmin, ymin, xmax, ymax = (max(0, int(value)) for value in box)
+        if peak >= self.template_threshold and xmax > xmin and ymax > ymin:
+            self.templates.put(int(label), gray_frame[ymin:ymax, xmin:xmax])
+        elif int(label) not in self.templates:
+            self.templates.put(int(label), template)
 
-    def build_tracklet(self, frame):
+    def build_tracklet(self, frame, gray_frame=None):
         detections = []
-        gray_frame = rgb2gray(frame)
-        gray_prev = rgb2gray(self.prev_frame)
-        
-        for label, xmin, ymin, xmax, ymax in self.detection_history[-1]:
-            template = gray_prev[ymin:ymax, xmin:xmax]
+        if gray_frame is None:
+            gray_frame = rgb2gray(frame)
+        gray_prev = self.prev_gray
+        requests = []
+        request_rows = []
+        track_signals = []
+        previous = self.store.frame()
+        predicted = None
+        if self.motion is not None and len(previous):
+            # search around where the motion model expects each track, not where it was
+            predicted = self.store.predict_centers(self.store.track_slots(previous[:, 0]), self.frame_index)
+            predicted = np.clip(np.round(predicted), 0, np.array(gray_frame.shape[::-1]) - 1).astype(np.int64)
+
+        for k, (label, xmin, ymin, xmax, ymax) in enumerate(previous):
+            template, cached = self.track_template(label, gray_prev, xmin, ymin, xmax, ymax)
             
             if template.size == 0 or template.shape[0] == 0 or template.shape[1] == 0:
                 detections.append([label, xmin, ymin, xmax, ymax])
                 continue
             
-            new_bbox = gray_frame
-            matching = match_template(new_bbox, template, pad_input=True)
-            
             bbox_height = ymax - ymin
             bbox_width = xmax - xmin
             center_x = (xmin + xmax) // 2
             center_y = (ymin + ymax) // 2
-            
-            gauss = gaussian(matching.shape, center_x, center_y, bbox_width // 2, bbox_height // 2)
-            output = matching * gauss
-            
-            best_y, best_x = np.unravel_index(np.argmax(output), output.shape)
-            
-            new_xmin = best_x - bbox_width // 2
-            new_ymin = best_y - bbox_height // 2
-            new_xmax = best_x + bbox_width // 2
-            new_ymax = best_y + bbox_height // 2
-            
-            detections.append([label, new_xmin, new_ymin, new_xmax, new_ymax])
-        
+            if predicted is not None:
+                center_x, center_y = int(predicted[k, 0]), int(predicted[k, 1])
+            levels = self.pyramid(template, cached, bbox_width, bbox_height, gray_frame.shape)
+            if not levels:
+                detections.append([label, xmin, ymin, xmax, ymax])
+                continue
+
+            window = None
+            if self.search_scale is not None:
+                window = search_window(gray_frame.shape, center_x, center_y,
+                                       bbox_width, bbox_height, self.search_scale)
+            if window is None:
+                best = None
+                for level_template, level_width, level_height in levels:
+                    match = self.match_full_frame(gray_frame, level_template, center_x, center_y,
+                                                  bbox_width, bbox_height)
+                    if best is None or match[2] > best[0][2]:
+                        best = (match, level_width, level_height)
+                (best_y, best_x, peak, sharpness), level_width, level_height = best
+                box = self.level_box(best_x, best_y, level_width, level_height, gray_frame.shape)
+                detections.append([label] + box)
+                self.update_template(label, gray_frame, template, box, peak)
+                track_signals.append((peak, sharpness, displacement(
+                    best_x - center_x, best_y - center_y, bbox_width, bbox_height)))
+                continue
+
+            # all scales of all tracks go through one batched correlation call
+            for level_template, level_width, level_height in levels:
+                requests.append((level_template, window, center_x, center_y, bbox_width, bbox_height))
+                request_rows.append((len(detections), template, level_width, level_height))
+            detections.append([label, xmin, ymin, xmax, ymax])
+
+        if requests:
+            best = {}
+            for (row, template, level_width, level_height), match, request in zip(
+                    request_rows, self.match_windows(gray_frame, requests), requests):
+                if row not in best or match[2] > best[row][1][2]:
+                    best[row] = ((template, level_width, level_height), match, request[2:])
+            for row, ((template, level_width, level_height), (best_y, best_x, peak, sharpness),
+                      (center_x, center_y, bbox_width, bbox_height)) in best.items():
+                box = self.level_box(best_x, best_y, level_width, level_height, gray_frame.shape)
+                label = detections[row][0]
+                detections[row] = [label] + box
+                self.update_template(label, gray_frame, template, box, peak)
+                track_signals.append((peak, sharpness, displacement(
+                    best_x - center_x, best_y - center_y, bbox_width, bbox_height)))
+
+        self.signals = frame_signals(track_signals)
         return detection_cast(detections)
 
-    def update_frame(self, frame):
+    def process_frame(self, frame):
+        with self.profiler.stage('rgb2gray'):
+            gray_frame = rgb2gray(frame)
+        detected = True
         if not self.frame_index:
             detections = self.init_tracklet(frame)
-            self.save_detections(detections)
-        elif self.frame_index % self.detection_rate == 0:
-            detections = extract_detections(frame, labels=self.labels)
-            detections = self.bind_tracklet(detections)
-            self.save_detections(detections)
+        elif self.scheduler.should_detect(self.frame_index, self.signals):
+            with self.profiler.stage('extract_detections'):
+                detections = self.detect(frame, labels=self.labels)
+            with self.profiler.stage('bind_tracklet'):
+                detections = self.bind_tracklet(detections)
         else:
-            detections = self.build_tracklet(frame)
+            with self.profiler.stage('build_tracklet'):
+                detections = self.build_tracklet(frame, gray_frame)
+            detected = False
         
-        self.detection_history.append(detections)
-        self.prev_frame = frame
-        self.frame_index += 1
-        
-        if self.return_images:
-            return draw_detections(frame, detections)
+        self.append_history(detections)
+        if detected:
+            # fresh boxes from the detector: templates are taken again from this frame
+            self.templates.clear()
+            self.templates.retain(detections[:, 0])
+            self.save_detections(detections)
+            self.scheduler.record_detection(self.frame_index)
+            self.signals = None
+            self.profiler.count('detector_frames')
         else:
-            return detections
+            self.profiler.count('correlation_frames')
+        self.prev_gray = gray_frame
+        return detections
 
 
 def main():
+    from moviepy.editor import VideoFileClip
     dirname = os.path.dirname(os.path.abspath(__file__))
     video_path = os.path.join(dirname, "data", "test.mp4")
     input_clip = VideoFileClip(video_path)
@@ -1,13 +1,30 @@
+import atexit
 import os
+from functools import lru_cache
+import cv2
 import numpy as np
-import torch
 from PIL import Image
-
-model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True, verbose=False)
-model.conf = 0.5
-model.iou = 0.45
+from config import DEFAULT_MODEL
+from detection_cache import DetectionCache, cache_config
+from detection_provider import seek
+from models import configure_model, get_model, model_source, model_thresholds
 
 COLOR_MAP = {}
+detection_cache = None
+active_model = DEFAULT_MODEL
+
+def use_model(name, **options):
+    global active_model
+    configure_model(name, **options)
+    active_model = name
+
+def enable_detection_cache(cache_dir, max_bytes=1 << 30):
+    global detection_cache
+    if detection_cache is not None:
+        detection_cache.flush()
+    detection_cache = DetectionCache(cache_dir, max_bytes=max_bytes)
+    atexit.register(detection_cache.flush)
+    return detection_cache
 
 def get_color(label):
     return COLOR_MAP.setdefault(label, np.random.randint(0, 256, size=3))
@@ -17,52 +34,144 @@ def detection_cast(detections):
         return np.empty((0, 5), dtype=np.int32)
     return np.array(detections, dtype=np.int32).reshape((-1, 5))
 
+def scale_boxes(detections, scale):
+    # ids stay, corners are multiplied by scale and rounded
+    scaled = detection_cast(detections).copy()
+    scaled[:, 1:] = np.round(scaled[:, 1:] * scale)
+    return scaled
+
+def clip_corners(shape, ll, rr):
+    upper = np.array(shape[:2], dtype=np.int32) - 1
+    return np.minimum(upper, np.maximum(ll, 0)), np.minimum(upper, np.maximum(rr, 0))
+
 def rectangle(shape, ll, rr, line_width=5):
-    ll = np.minimum(np.array(shape[:2], dtype=np.int32) - 1, np.maximum(ll, 0))
-    rr = np.minimum(np.array(shape[:2], dtype=np.int32) - 1, np.maximum(rr, 0))
-    result = []
+    ll, rr = clip_corners(shape, ll, rr)
+    rows = []
+    cols = []
+    for c in range(line_width):
+        vertical = np.arange(ll[0] + c, rr[0] - c + 1)
+        horizontal = np.arange(ll[1] + c + 1, rr[1] - c)
+        rows += [vertical, vertical, np.full_like(horizontal, ll[0] + c), np.full_like(horizontal, rr[0] - c)]
+        cols += [np.full_like(vertical, ll[1] + c), np.full_like(vertical, rr[1] - c), horizontal, horizontal]
+    return np.concatenate(rows), np.concatenate(cols)
+
+def draw_rectangle(frame, ll, rr, color, line_width=5):
+    # same pixels as frame[rectangle(...)] = color, painted with slices
+    ll, rr = clip_corners(frame.shape, ll, rr)
+    top, left = int(ll[0]), int(ll[1])
+    bottom, right = int(rr[0]), int(rr[1])
     for c in range(line_width):
-        for i in range(ll[0] + c, rr[0] - c + 1):
-            result.append((i, ll[1] + c))
-            result.append((i, rr[1] - c))
-        for j in range(ll[1] + c + 1, rr[1] - c):
-            result.append((ll[0] + c, j))
-            result.append((rr[0] - c, j))
-    return tuple(zip(*result))
+        if top + c <= bottom - c:
+            frame[top + c:bottom - c + 1, left + c] = color
+            frame[top + c:bottom - c + 1, right - c] = color
+        if left + c + 1 < right - c:
+            frame[top + c, left + c + 1:right - c] = color
+            frame[bottom - c, left + c + 1:right - c] = color
+    return frame
+
+@lru_cache(maxsize=32)
+def label_mask(model_name, labels):
+    names = get_model(model_name).names
+    if isinstance(names, dict):
+        names = [names[cls_id] for cls_id in sorted(names)]
+    wanted = {label.lower() for label in labels}
+    return np.array([name.lower() in wanted for name in names], dtype=bool)
+
+def filter_detections(raw_detections, min_confidence=0.5, labels=None):
+    keep = raw_detections[:, 4] >= min_confidence
+    if labels is not None:
+        keep &= label_mask(active_model, tuple(labels))[raw_detections[:, 5].astype(np.int64)]
+    raw_detections = raw_detections[keep]
+    return detection_cast(np.column_stack([raw_detections[:, 5], raw_detections[:, :4]]))
+
+def extract_detections_batch(frames, min_confidence=0.5, labels=None, batch_size=8):
+    frames = list(frames)
+    detections = [None] * len(frames)
+    keys = None
+    if detection_cache is not None:
+        conf, iou = model_thresholds(active_model)
+        config = cache_config(active_model, conf, iou, min_confidence, labels, model_source(active_model))
+        keys = [detection_cache.frame_key(frame, config) for frame in frames]
+        detections = [detection_cache.get(key) for key in keys]
+    missing = [k for k, frame_detections in enumerate(detections) if frame_detections is None]
+    if not missing:
+        return detections
+
+    # torch is only needed once something has to go through the network
+    import torch
+    model = get_model(active_model)
+    with torch.inference_mode():
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            results = model([frames[k] for k in chunk])
+            for k, raw_detections in zip(chunk, results.xyxy):
+                detections[k] = filter_detections(raw_detections.cpu().numpy(),
+                                                  min_confidence, labels)
+                if keys is not None:
+                    detection_cache.put(keys[k], detections[k])
+    return detections
 
 def extract_detections(frame, min_confidence=0.5, labels=None):
-    results = model(frame)
-    detections = results.xyxy[0].cpu().numpy()
-    final_detections = []
+    return extract_detections_batch([frame], min_confidence, labels)[0]
+
+class SharedDetector:
+    # runs the detector at most once per frame and hands copies to every tracker fed that frame.
+    # Frames are told apart by the number trackers pass through seek() (plus the shape, trackers
+    # may resize differently), not by object identity: a reused frame buffer is a new frame.
+    # Callers that never seek get a content hash instead.
+    def __init__(self, detect=extract_detections):
+        self.detect = detect
+        self.frame_index = None
+        self.frame_key = None
+        self.results = {}
+        self.calls = 0
 
-    for det in detections:
-        x1, y1, x2, y2, conf, cls_id = det
-        cls_id = int(cls_id)
-        label_name = model.names[cls_id]
+    def key_of(self, frame):
+        if self.frame_index is not None:
+            return self.frame_index, getattr(frame, 'shape', None)
+        return DetectionCache.frame_key(frame, b'')
 
-        if conf < min_confidence:
-            continue
+    def __call__(self, frame, min_confidence=0.5, labels=None):
+        frame_key = self.key_of(frame)
+        if frame_key != self.frame_key:
+            self.frame_key = frame_key
+            self.results = {}
+        key = (min_confidence, None if labels is None else tuple(labels))
+        if key not in self.results:
+            self.results[key] = self.detect(frame, min_confidence=min_confidence, labels=labels)
+            self.calls += 1
+        return self.results[key].copy()
 
-        if labels is not None:
-             if label_name.lower() not in [l.lower() for l in labels]:
-                continue
+    def seek(self, frame_index):
+        self.frame_index = frame_index
+        seek(self.detect, frame_index)
 
-        final_detections.append([cls_id, x1, y1, x2, y2])
+    @property
+    def source_coordinates(self):
+        return getattr(self.detect, 'source_coordinates', False)
 
-    return detection_cast(final_detections)
+def draw_label(frame, text, xmin, ymin, color):
+    x = int(min(max(xmin, 0), frame.shape[1] - 1))
+    y = int(min(max(ymin - 8, 12), frame.shape[0] - 1))
+    cv2.putText(frame, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                tuple(int(channel) for channel in color), 2, cv2.LINE_AA)
 
-def draw_detections(frame, detections):
-    frame = frame.copy()
+def draw_detections(frame, detections, out=None, show_labels=False):
+    if out is None:
+        out = frame.copy()
+    elif out is not frame:
+        np.copyto(out, frame)
     for detection in detections:
         label = detection[0]
         xmin = detection[1]
         ymin = detection[2]
         xmax = detection[3]
         ymax = detection[4]
-        rr, cc = rectangle(frame.shape, (ymin, xmin), (ymax, xmax))
         color = get_color(label)
-        frame[rr, cc] = color
-    return frame
+        draw_rectangle(out, (ymin, xmin), (ymax, xmax), color)
+        if show_labels:
+            draw_label(out, str(label), xmin, ymin, color)
+    return out
 
 def main():
     dirname = os.path.dirname(__file__)
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import uuid
+import numpy as np
+
+INDEX_SUFFIX = '.index.npz'
+DATA_SUFFIX = '.npy'
+
+
+def cache_config(model_name, conf, iou, min_confidence, labels, source=None):
+    # source: what the weights were loaded from (models.model_source); left out of the key
+    # for the default pretrained weights so that existing entries stay valid
+    labels = None if labels is None else tuple(sorted(label.lower() for label in labels))
+    config = (model_name, float(conf), float(iou), float(min_confidence), labels)
+    if source is not None:
+        config += (source,)
+    return repr(config).encode()
+
+
+# Entries are keyed by a hash of the frame pixels and the detector config and written
+# in shards: an (R, 5) int32 .npy with the rows of all frames plus an .index.npz with
+# the frame keys and row offsets. Shards are memory-mapped on read and the least
+# recently used ones are deleted once the cache grows past max_bytes.
+class DetectionCache:
+    def __init__(self, cache_dir, max_bytes=1 << 30, flush_every=512):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.index = {}
+        self.shards = {}
+        self.touched = set()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in sorted(os.listdir(cache_dir)):
+            if name.endswith(INDEX_SUFFIX):
+                self.load_shard(name[:-len(INDEX_SUFFIX)])
+
+    @staticmethod
+    def frame_key(frame, config):
+        frame = np.ascontiguousarray(frame)
+        digest = hashlib.blake2b(config, digest_size=16)
+        digest.update(repr((frame.shape, frame.dtype.str)).encode())
+        digest.update(frame.data)
+        return digest.digest()
+
+    def shard_path(self, shard, suffix):
+        return os.path.join(self.cache_dir, shard + suffix)
+
+    def load_shard(self, shard):
+        try:
+            with np.load(self.shard_path(shard, INDEX_SUFFIX)) as index:
+                keys = index['keys']
+                offsets = index['offsets']
+        except (OSError, ValueError, KeyError):
+            return
+        for k, key in enumerate(keys):
+            self.index[key.tobytes()] = (shard, offsets[k], offsets[k + 1])
+
+    def shard_rows(self, shard):
+        if shard not in self.shards:
+            self.shards[shard] = np.load(self.shard_path(shard, DATA_SUFFIX), mmap_mode='r')
+        if shard not in self.touched:
+            os.utime(self.shard_path(shard, DATA_SUFFIX))
+            self.touched.add(shard)
+        return self.shards[shard]
+
+    def get(self, key):
+        if key in self.index:
+            shard, start, end = self.index[key]
+            try:
+                rows = self.shard_rows(shard)
+            except OSError:
+                self.drop_shard(shard)
+            else:
+                self.hits += 1
+                return np.array(rows[start:end], dtype=np.int32)
+        if key in self.pending:
+            self.hits += 1
+            return self.pending[key].copy()
+        self.misses += 1
+        return None
+
+    def put(self, key, detections):
+        self.pending[key] = np.asarray(detections, dtype=np.int32).reshape(-1, 5)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        shard = uuid.uuid4().hex
+        pending_keys = list(self.pending)
+        keys = np.frombuffer(b''.join(pending_keys), dtype=np.uint8).reshape(len(pending_keys), -1)
+        offsets = np.zeros(len(pending_keys) + 1, dtype=np.int64)
+        np.cumsum([len(detections) for detections in self.pending.values()], out=offsets[1:])
+        rows = np.concatenate(list(self.pending.values()))
+
+        # data first, index last: a shard without an index is never read
+        tmp_path = self.shard_path(shard, '.tmp' + DATA_SUFFIX)
+        np.save(tmp_path, rows)
+        os.replace(tmp_path, self.shard_path(shard, DATA_SUFFIX))
+        tmp_path = self.shard_path(shard, '.tmp' + INDEX_SUFFIX)
+        np.savez(tmp_path, keys=keys, offsets=offsets)
+        os.replace(tmp_path, self.shard_path(shard, INDEX_SUFFIX))
+
+        for k, key in enumerate(pending_keys):
+            self.index[key] = (shard, offsets[k], offsets[k + 1])
+        self.pending = {}
+        self.evict()
+
+    def drop_shard(self, shard):
+        self.shards.pop(shard, None)
+        self.touched.discard(shard)
+        self.index = {key: entry for key, entry in self.index.items() if entry[0] != shard}
+        for suffix in (INDEX_SUFFIX, DATA_SUFFIX):
+            try:
+                os.remove(self.shard_path(shard, suffix))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        shards = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(DATA_SUFFIX) and '.tmp' not in name:
+                shard = name[:-len(DATA_SUFFIX)]
+                try:
+                    data_stat = os.stat(self.shard_path(shard, DATA_SUFFIX))
+                    index_size = os.path.getsize(self.shard_path(shard, INDEX_SUFFIX))
+                except FileNotFoundError:
+                    continue
+                shards.append((data_stat.st_mtime, data_stat.st_size + index_size, shard))
+        total = sum(size for _, size, _ in shards)
+        for _, size, shard in sorted(shards):
+            if total <= self.max_bytes:
+                break
+            self.drop_shard(shard)
+            total -= size
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.index) + len(self.pending)}
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+from mot_io import load_mot
+
+# A detection provider is what Tracker and CorrelationTracker take as `detector`:
+# provider(frame, min_confidence=None, labels=None) -> (N, 5) int32 [id, xmin, ymin, xmax, ymax].
+# Providers that do not look at the pixels are told the frame number with seek(frame_index)
+# before every call, so any frame stand-in works for them.
+
+
+def no_detections():
+    return np.empty((0, 5), dtype=np.int32)
+
+
+class DetectionProvider:
+    def __init__(self):
+        self.frame_index = 0
+        self.calls = 0
+
+    def seek(self, frame_index):
+        self.frame_index = frame_index
+
+    def detect(self, frame, min_confidence, labels):
+        raise NotImplementedError
+
+    def __call__(self, frame=None, min_confidence=None, labels=None):
+        self.calls += 1
+        return self.detect(frame, min_confidence, labels)
+
+
+class NetworkDetections(DetectionProvider):
+    def __init__(self, min_confidence=0.5, detect=None):
+        super().__init__()
+        if detect is None:
+            from detection import extract_detections as detect
+        self.min_confidence = min_confidence
+        self.detect_frame = detect
+
+    def detect(self, frame, min_confidence, labels):
+        if min_confidence is None:
+            min_confidence = self.min_confidence
+        return self.detect_frame(frame, min_confidence=min_confidence, labels=labels)
+
+
+class MOTDetections(DetectionProvider):
+    # public detections from a MOTChallenge det.txt:
+    # frame, id, left, top, width, height, conf, x, y, z with 1-based frame numbers.
+    # Rows are grouped by frame once at load time, a lookup is two offsets and a slice.
+    # Confidence is on the scale of the detector that produced the file, not the network's
+    # [0, 1], so the threshold is a property of the provider and per-call values are ignored.
+    # Boxes are in source image pixels whatever frame the tracker passes in.
+    source_coordinates = True
+
+    def __init__(self, det_path, min_confidence=None, first_frame=1):
+        super().__init__()
+        self.det_path = det_path
+        self.min_confidence = min_confidence
+        table = load_mot(det_path, first_frame=first_frame)
+        self.boxes = np.column_stack([np.zeros(len(table.boxes)), table.boxes]).astype(np.int32)
+        self.confidence = table.confidence
+        self.num_frames = table.num_frames
+        self.offsets = table.offsets
+
+    def __len__(self):
+        return self.num_frames
+
+    def frame_detections(self, frame_index):
+        if not 0 <= frame_index < self.num_frames:
+            return no_detections()
+        start, end = self.offsets[frame_index], self.offsets[frame_index + 1]
+        boxes = self.boxes[start:end]
+        if self.min_confidence is not None:
+            boxes = boxes[self.confidence[start:end] >= self.min_confidence]
+        return boxes.copy()
+
+    def detect(self, frame, min_confidence, labels):
+        return self.frame_detections(self.frame_index)
+
+    def frames(self):
+        # frame stand-ins for trackers that never read pixels (Tracker with return_images=False)
+        return range(self.num_frames)
+
+
+def mot_detections(seq_path, **kwargs):
+    return MOTDetections(os.path.join(seq_path, 'det', 'det.txt'), **kwargs)
+
+
+def seek(detector, frame_index):
+    if hasattr(detector, 'seek'):
+        detector.seek(frame_index)
@@ -1,61 +1,63 @@
 import os
-import cv2
-import numpy as np
+import argparse
+import configparser
 from metrics import motp_mota
 from cross_correlation import CorrelationTracker
+from detection import enable_detection_cache
+from frame_source import mot_sequence_source
+from mot_io import MOTWriter, load_mot
+from profiling import make_profiler, save_profile
 
-def parse_mot_gt(gt_path):
-    gt_dict = {}
-    with open(gt_path, 'r') as f:
-        for line in f:
-            parts = line.strip().split(',')
-            frame = int(parts[0])
-            obj_id = int(parts[1])
-            left = float(parts[2])
-            top = float(parts[3])
-            width = float(parts[4])
-            height = float(parts[5])
-            xmin = left
-            ymin = top
-            xmax = left + width
-            ymax = top + height
-            detection = [obj_id, xmin, ymin, xmax, ymax]
-            if frame not in gt_dict:
-                gt_dict[frame] = []
-            gt_dict[frame].append(detection)
-    num_frames = max(gt_dict.keys())
-    ground_truth = []
-    for i in range(1, num_frames + 1):
-        if i in gt_dict:
-            ground_truth.append(gt_dict[i])
-        else:
-            ground_truth.append([])
-    return ground_truth
+def parse_mot_gt(gt_path, **filters):
+    # per-frame (N, 5) [id, xmin, ymin, xmax, ymax] rows, indexable and sliceable by frame
+    return load_mot(gt_path, **filters)
 
-def run_tracker_on_mot_sequence(seq_path, detection_rate=5):
-    img_dir = os.path.join(seq_path, 'img1')
-    images = sorted([img for img in os.listdir(img_dir) if img.endswith('.jpg')])
-    tracker = CorrelationTracker(detection_rate=detection_rate, return_images=False)
+def read_seqinfo(seq_path):
+    parser = configparser.ConfigParser()
+    parser.read(os.path.join(seq_path, 'seqinfo.ini'))
+    info = dict(parser['Sequence'])
+    for key in ('framerate', 'seqlength', 'imwidth', 'imheight'):
+        info[key] = int(info[key])
+    return info
+
+def find_sequences(root):
+    return [os.path.join(root, name) for name in sorted(os.listdir(root))
+            if os.path.isfile(os.path.join(root, name, 'seqinfo.ini'))]
+
+def run_tracker_on_mot_sequence(seq_path, detection_rate=5, frame_cache_dir=None, profiler=None,
+                                output_path=None):
+    source = mot_sequence_source(seq_path, cache_dir=frame_cache_dir)
+    tracker = CorrelationTracker(detection_rate=detection_rate, return_images=False, profiler=profiler)
+    writer = MOTWriter(output_path) if output_path else None
     hypotheses = []
     print(f"Обработка последовательности: {os.path.basename(seq_path)}")
-    print(f"Всего кадров: {len(images)}")
-    for img_name in images:
-        img_path = os.path.join(img_dir, img_name)
-        frame = cv2.imread(img_path)
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        detections = tracker.update_frame(frame)
-        if hasattr(detections, 'tolist'):
-            detections = detections.tolist()
+    print(f"Всего кадров: {len(source)}")
+    for detections in tracker.track(source):
+        if writer is not None:
+            writer.write(len(hypotheses), detections)
         hypotheses.append(detections)
         if len(hypotheses) % 50 == 0:
             print(f"Обработано {len(hypotheses)} кадров...")
+    if writer is not None:
+        writer.close()
     return hypotheses
 
 def main():
+    parser = argparse.ArgumentParser(description="Оценка трекера на MOT15")
+    parser.add_argument('--profile', type=str, default=None,
+                        help="Сохранить JSON-сводку задержек по этапам в файл")
+    parser.add_argument('--trace', type=str, default=None,
+                        help="Сохранить Chrome trace (chrome://tracing) в файл")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Сохранить треки в формате MOTChallenge (frame,id,left,top,w,h,...)")
+    args = parser.parse_args()
+    profiler = make_profiler(args.profile, args.trace)
+    enable_detection_cache(".detection_cache")
     dataset_path = "data/MOT15/train/ADL-Rundle-6" 
     gt_path = os.path.join(dataset_path, "gt", "gt.txt")
     ground_truth = parse_mot_gt(gt_path)
-    hypotheses = run_tracker_on_mot_sequence(dataset_path, detection_rate=5)
+    hypotheses = run_tracker_on_mot_sequence(dataset_path, detection_rate=5, profiler=profiler,
+                                             output_path=args.output)
     min_len = min(len(ground_truth), len(hypotheses))
     ground_truth = ground_truth[:min_len]
     hypotheses = hypotheses[:min_len]
@@ -66,6 +68,7 @@ def main():
     print(f"MOTA (Accuracy):  {mota:.4f}")
     print(f"MOTP (Precision): {motp:.4f}")
     print("="*40)
+    save_profile(profiler, args.profile, args.trace)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+import os
+import hashlib
+import uuid
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+def read_rgb(path):
+    frame = cv2.imread(path, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise IOError(f"Не удалось прочитать кадр {path}")
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+class FrameSource:
+    def __iter__(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class ArraySource(FrameSource):
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class VideoSource(FrameSource):
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        # imported here so that image and array sources work without moviepy
+        from moviepy.editor import VideoFileClip
+        clip = VideoFileClip(self.path)
+        try:
+            yield from clip.iter_frames()
+        finally:
+            clip.close()
+
+    def __len__(self):
+        from moviepy.editor import VideoFileClip
+        clip = VideoFileClip(self.path)
+        try:
+            return int(round(clip.duration * clip.fps))
+        finally:
+            clip.close()
+
+
+class ImageSequenceSource(FrameSource):
+    # decodes read_ahead frames in advance on a thread pool; with cache_dir the whole
+    # sequence is decoded once into an (N, H, W, 3) uint8 .npy that later runs memory-map
+    def __init__(self, img_dir, extension='.jpg', read_ahead=8, workers=4, cache_dir=None):
+        self.img_dir = img_dir
+        self.paths = [os.path.join(img_dir, name) for name in sorted(os.listdir(img_dir))
+                      if name.endswith(extension)]
+        self.read_ahead = read_ahead
+        self.workers = workers
+        self.cache_dir = cache_dir
+
+    def __len__(self):
+        return len(self.paths)
+
+    def decode(self, paths):
+        paths = iter(paths)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque(executor.submit(read_rgb, path)
+                            for path in islice(paths, self.read_ahead))
+            while pending:
+                frame = pending.popleft().result()
+                path = next(paths, None)
+                if path is not None:
+                    pending.append(executor.submit(read_rgb, path))
+                yield frame
+
+    def cache_path(self):
+        digest = hashlib.sha1()
+        for path in self.paths:
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        name = os.path.basename(os.path.dirname(os.path.abspath(self.img_dir)))
+        return os.path.join(self.cache_dir, f"{name}-{digest.hexdigest()[:16]}.npy")
+
+    def build_cache(self, path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        frames = self.decode(self.paths)
+        first = next(frames)
+        # several processes may build the same sequence at once (benchmark workers), each
+        # writes its own file and the first finished one wins
+        tmp_path = f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp.npy"
+        try:
+            cache = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8,
+                                              shape=(len(self.paths),) + first.shape)
+            cache[0] = first
+            for frame_num, frame in enumerate(frames, 1):
+                cache[frame_num] = frame
+            cache.flush()
+            del cache
+            os.replace(tmp_path, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def frames(self):
+        if self.cache_dir is None or not self.paths:
+            return self.decode(self.paths)
+        path = self.cache_path()
+        if not os.path.exists(path):
+            self.build_cache(path)
+        return iter(np.load(path, mmap_mode='r'))
+
+    def __iter__(self):
+        return self.frames()
+
+
+def mot_sequence_source(seq_path, **kwargs):
+    img_dir = os.path.join(seq_path, 'img1')
+    return ImageSequenceSource(img_dir if os.path.isdir(img_dir) else seq_path, **kwargs)
+
+
+def open_source(source, **kwargs):
+    if isinstance(source, FrameSource):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        if os.path.isdir(source):
+            return mot_sequence_source(source, **kwargs)
+        return VideoSource(source)
+    return ArraySource(source)
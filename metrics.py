@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def iou_score(bbox1, bbox2):
     assert len(bbox1) == 4
     assert len(bbox2) == 4
@@ -13,88 +16,136 @@ def iou_score(bbox1, bbox2):
         return 0.0
     iou = area_intersection / area_union
     return iou
-def motp(obj, hyp, threshold=0.5):
-    dist_sum = 0
-    match_count = 0
-    matches = {}
-    for frame_obj, frame_hyp in zip(obj, hyp):
-        frame_obj_dict = {detection[0]: detection for detection in frame_obj}
-        frame_hyp_dict = {detection[0]: detection for detection in frame_hyp}
-        matched_new = {}
-        for obj_id, hyp_id in matches.items():
-            if obj_id in frame_obj_dict and hyp_id in frame_hyp_dict:
-                iou = iou_score(frame_hyp_dict[hyp_id][1:], frame_obj_dict[obj_id][1:])
-                if iou > threshold:
-                    match_count += 1
-                    dist_sum += iou
-                    matched_new[obj_id] = hyp_id
-                    del frame_obj_dict[obj_id]
-                    del frame_hyp_dict[hyp_id]
-        iou_list = []
-        for obj_id, obj_detection in frame_obj_dict.items():
-            for hyp_id, hyp_detection in frame_hyp_dict.items():
-                iou = iou_score(obj_detection[1:], hyp_detection[1:])
-                if iou > threshold:
-                    iou_list.append((iou, obj_id, hyp_id))
-        iou_list.sort(reverse=True, key=lambda x: x[0])
-        for iou, obj_id, hyp_id in iou_list:
-            if obj_id in matched_new or hyp_id in matched_new.values():
-                continue
-            dist_sum += iou
-            match_count += 1
-            matched_new[obj_id] = hyp_id
-        matches = matched_new
-    MOTP = 0 if match_count == 0 else dist_sum / match_count
-    return MOTP
 
 
-def motp_mota(obj, hyp, threshold=0.5):
-    dist_sum = 0
-    match_count = 0
-    missed_count = 0
-    false_positive = 0
-    mismatch_error = 0
-    count_obj = 0
-    matches = {}
-    for frame_idx, (frame_obj, frame_hyp) in enumerate(zip(obj, hyp)):
-        frame_obj_dict = {detection[0]: detection for detection in frame_obj}
-        frame_hyp_dict = {detection[0]: detection for detection in frame_hyp}
-        len_frame_obj = len(frame_obj_dict)
-        len_frame_hyp = len(frame_hyp_dict)
-        old_frame_hyp_dict = frame_hyp_dict.copy()
+def iou_matrix(bboxes1, bboxes2):
+    bboxes1 = np.asarray(bboxes1, dtype=np.float64).reshape(-1, 4)
+    bboxes2 = np.asarray(bboxes2, dtype=np.float64).reshape(-1, 4)
+    x1_inter = np.maximum(bboxes1[:, None, 0], bboxes2[None, :, 0])
+    y1_inter = np.maximum(bboxes1[:, None, 1], bboxes2[None, :, 1])
+    x2_inter = np.minimum(bboxes1[:, None, 2], bboxes2[None, :, 2])
+    y2_inter = np.minimum(bboxes1[:, None, 3], bboxes2[None, :, 3])
+    area_intersection = np.maximum(0, y2_inter - y1_inter) * np.maximum(0, x2_inter - x1_inter)
+    area_a = (bboxes1[:, 2] - bboxes1[:, 0]) * (bboxes1[:, 3] - bboxes1[:, 1])
+    area_b = (bboxes2[:, 2] - bboxes2[:, 0]) * (bboxes2[:, 3] - bboxes2[:, 1])
+    area_union = area_a[:, None] + area_b[None, :] - area_intersection
+    iou = np.zeros_like(area_union)
+    np.divide(area_intersection, area_union, out=iou, where=area_union != 0)
+    return iou
+
+
+def greedy_pairs(iou, threshold, inclusive=False):
+    # candidate pairs above threshold, best first; ties keep row-major order like a stable sort
+    rows, cols = np.nonzero(iou >= threshold if inclusive else iou > threshold)
+    values = iou[rows, cols]
+    order = np.argsort(-values, kind='stable')
+    return [(values[k], rows[k], cols[k]) for k in order]
+
+
+def iou_pairs(bboxes1, bboxes2):
+    # elementwise IoU of aligned rows, same arithmetic as iou_score
+    x1_inter = np.maximum(bboxes1[:, 0], bboxes2[:, 0])
+    y1_inter = np.maximum(bboxes1[:, 1], bboxes2[:, 1])
+    x2_inter = np.minimum(bboxes1[:, 2], bboxes2[:, 2])
+    y2_inter = np.minimum(bboxes1[:, 3], bboxes2[:, 3])
+    area_intersection = np.maximum(0, y2_inter - y1_inter) * np.maximum(0, x2_inter - x1_inter)
+    area_a = (bboxes1[:, 2] - bboxes1[:, 0]) * (bboxes1[:, 3] - bboxes1[:, 1])
+    area_b = (bboxes2[:, 2] - bboxes2[:, 0]) * (bboxes2[:, 3] - bboxes2[:, 1])
+    area_union = area_a + area_b - area_intersection
+    iou = np.zeros_like(area_union)
+    np.divide(area_intersection, area_union, out=iou, where=area_union != 0)
+    return iou
+
+
+def frame_index(frame):
+    # rows as (N, 5) float array plus id -> row of its last occurrence, like the old per-frame dicts
+    frame = np.asarray(frame, dtype=np.float64).reshape(-1, 5)
+    return frame, dict(zip(frame[:, 0].tolist(), range(len(frame))))
+
+
+class MOTAccumulator:
+    def __init__(self, threshold=0.5, persist_matches=True):
+        self.threshold = threshold
+        self.persist_matches = persist_matches
+        self.matches = {}
+        self.dist_sum = 0.0
+        self.match_count = 0
+        self.missed_count = 0
+        self.false_positive = 0
+        self.mismatch_error = 0
+        self.count_obj = 0
+        self.frame_count = 0
+
+    def update(self, gt_frame, hyp_frame):
+        frame_obj, obj_index = frame_index(gt_frame)
+        frame_hyp, hyp_index = frame_index(hyp_frame)
+        len_frame_obj = len(obj_index)
+        len_frame_hyp = len(hyp_index)
+        self.count_obj += len_frame_obj
+        self.frame_count += 1
+
         matched_new = {}
-        count_obj += len(frame_obj_dict)
-        for obj_id, hyp_id in matches.items():
-            if obj_id in frame_obj_dict and hyp_id in frame_hyp_dict:
-                iou = iou_score(frame_hyp_dict[hyp_id][1:], frame_obj_dict[obj_id][1:])
-                if iou > threshold:
-                    match_count += 1
-                    dist_sum += iou
+        matched_hyp = set()
+        kept = [(obj_id, hyp_id) for obj_id, hyp_id in self.matches.items()
+                if obj_id in obj_index and hyp_id in hyp_index]
+        if kept:
+            obj_rows = [obj_index[obj_id] for obj_id, _ in kept]
+            hyp_rows = [hyp_index[hyp_id] for _, hyp_id in kept]
+            ious = iou_pairs(frame_obj[obj_rows, 1:], frame_hyp[hyp_rows, 1:])
+            for (obj_id, hyp_id), iou in zip(kept, ious.tolist()):
+                if iou > self.threshold:
+                    self.match_count += 1
+                    self.dist_sum += iou
                     matched_new[obj_id] = hyp_id
-                    del frame_obj_dict[obj_id]
-                    del frame_hyp_dict[hyp_id]
-        iou_list = []
-        for obj_id, obj_detection in frame_obj_dict.items():
-            for hyp_id, hyp_detection in frame_hyp_dict.items():
-                iou = iou_score(obj_detection[1:], hyp_detection[1:])
-                if iou > threshold:
-                    iou_list.append((iou, obj_id, hyp_id))
-        iou_list.sort(reverse=True, key=lambda x: x[0])
-        for iou, obj_id, hyp_id in iou_list:
-            if obj_id in matched_new or hyp_id in matched_new.values():
-                continue
-            dist_sum += iou
-            match_count += 1
-            matched_new[obj_id] = hyp_id
+                    matched_hyp.add(hyp_id)
+
+        obj_ids = [obj_id for obj_id in obj_index if obj_id not in matched_new]
+        hyp_ids = [hyp_id for hyp_id in hyp_index if hyp_id not in matched_hyp]
+        if obj_ids and hyp_ids:
+            iou = iou_matrix(frame_obj[[obj_index[obj_id] for obj_id in obj_ids], 1:],
+                             frame_hyp[[hyp_index[hyp_id] for hyp_id in hyp_ids], 1:])
+            for value, row, col in greedy_pairs(iou, self.threshold):
+                obj_id = obj_ids[row]
+                hyp_id = hyp_ids[col]
+                if obj_id in matched_new or hyp_id in matched_hyp:
+                    continue
+                self.dist_sum += value
+                self.match_count += 1
+                matched_new[obj_id] = hyp_id
+                matched_hyp.add(hyp_id)
+
         for obj_new, hyp_new in matched_new.items():
-            if obj_new in matches and matches[obj_new] != hyp_new:
-                mismatch_error += 1
-        matches = matched_new if len(matched_new) > 0 else matches
-        missed_count += len_frame_obj - len(matched_new)
-        false_positive += len_frame_hyp - len(matched_new)
-        pass
+            if obj_new in self.matches and self.matches[obj_new] != hyp_new:
+                self.mismatch_error += 1
+        if matched_new or not self.persist_matches:
+            self.matches = matched_new
+        self.missed_count += len_frame_obj - len(matched_new)
+        self.false_positive += len_frame_hyp - len(matched_new)
 
-    MOTP = 0 if match_count == 0 else dist_sum / match_count
-    MOTA = 1 - (missed_count + false_positive + mismatch_error) / count_obj
+    def compute(self):
+        errors = self.missed_count + self.false_positive + self.mismatch_error
+        return {
+            'motp': 0 if self.match_count == 0 else float(self.dist_sum / self.match_count),
+            'mota': 0 if self.count_obj == 0 else 1 - errors / self.count_obj,
+            'num_frames': self.frame_count,
+            'num_objects': self.count_obj,
+            'num_matches': self.match_count,
+            'misses': self.missed_count,
+            'false_positives': self.false_positive,
+            'id_switches': self.mismatch_error,
+        }
 
-    return MOTP, MOTA
+
+def motp(obj, hyp, threshold=0.5):
+    accumulator = MOTAccumulator(threshold=threshold, persist_matches=False)
+    for frame_obj, frame_hyp in zip(obj, hyp):
+        accumulator.update(frame_obj, frame_hyp)
+    return accumulator.compute()['motp']
+
+
+def motp_mota(obj, hyp, threshold=0.5):
+    accumulator = MOTAccumulator(threshold=threshold)
+    for frame_obj, frame_hyp in zip(obj, hyp):
+        accumulator.update(frame_obj, frame_hyp)
+    summary = accumulator.compute()
+    return summary['motp'], summary['mota']
@@ -0,0 +1,146 @@
+import os
+import sys
+import threading
+import numpy as np
+from config import COCO_INSTANCE_CATEGORY_NAMES, DEFAULT_CONF, DEFAULT_IOU, DEFAULT_MODEL
+
+# torch, torchvision and the hub are imported only inside the loaders: importing this
+# module (and detection, tracker, metrics through it) stays cheap until the first inference
+
+
+class DetectorResults:
+    def __init__(self, xyxy):
+        self.xyxy = xyxy
+
+
+class TorchvisionDetector:
+    # gives a torchvision detection model the YOLOv5 hub interface used by detection.py:
+    # model(list_of_rgb_frames).xyxy -> per frame (N, 6) [x1, y1, x2, y2, conf, cls]
+    def __init__(self, model, names, conf=DEFAULT_CONF, iou=DEFAULT_IOU):
+        self.model = model
+        self.names = dict(enumerate(names))
+        self.conf = conf
+        self.iou = iou
+
+    def __call__(self, frames):
+        import torch
+        self.model.nms_thresh = self.iou
+        tensors = [torch.from_numpy(np.ascontiguousarray(frame)).permute(2, 0, 1).float() / 255
+                   for frame in frames]
+        xyxy = []
+        for output in self.model(tensors):
+            keep = output['scores'] >= self.conf
+            xyxy.append(torch.cat([output['boxes'][keep], output['scores'][keep, None],
+                                   output['labels'][keep, None].float()], dim=1))
+        return DetectorResults(xyxy)
+
+
+def load_yolov5(variant, weights=None, repo=None):
+    import torch
+    # repo: local clone of ultralytics/yolov5, then nothing is fetched from the network
+    source = 'github' if repo is None else 'local'
+    repo = 'ultralytics/yolov5' if repo is None else repo
+    if weights is None:
+        return torch.hub.load(repo, variant, pretrained=True, verbose=False, source=source)
+    return torch.hub.load(repo, 'custom', path=weights, verbose=False, source=source)
+
+
+def load_ssd300(weights=None, repo=None):
+    import torch
+    import torchvision
+    if weights is None:
+        model = torchvision.models.detection.ssd300_vgg16(
+            weights=torchvision.models.detection.SSD300_VGG16_Weights.DEFAULT
+        )
+    else:
+        model = torchvision.models.detection.ssd300_vgg16(weights=None, weights_backbone=None)
+        model.load_state_dict(torch.load(weights, map_location='cpu'))
+    model.eval()
+    return TorchvisionDetector(model, COCO_INSTANCE_CATEGORY_NAMES)
+
+
+MODEL_LOADERS = {
+    'yolov5n': lambda **options: load_yolov5('yolov5n', **options),
+    'yolov5s': lambda **options: load_yolov5('yolov5s', **options),
+    'yolov5m': lambda **options: load_yolov5('yolov5m', **options),
+    'ssd300': load_ssd300,
+}
+
+loaded_models = {}
+model_options = {}
+load_lock = threading.Lock()
+torch_threads = None
+
+
+def check_name(name):
+    if name not in MODEL_LOADERS:
+        raise ValueError(f"Unknown model {name!r}, expected one of {sorted(MODEL_LOADERS)}")
+
+
+def configure_model(name=DEFAULT_MODEL, weights=None, repo=None, conf=DEFAULT_CONF, iou=DEFAULT_IOU):
+    check_name(name)
+    model_options[name] = {'weights': weights, 'repo': repo, 'conf': conf, 'iou': iou}
+    if name in loaded_models:
+        loaded_models[name].conf = conf
+        loaded_models[name].iou = iou
+
+
+def set_num_threads(num_threads):
+    # process-wide torch intra-op thread count, meant to be called once at startup; applied
+    # right away if torch is already imported, otherwise when the first model is loaded
+    global torch_threads
+    torch_threads = num_threads
+    if num_threads is not None and 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(num_threads)
+
+
+def model_thresholds(name=DEFAULT_MODEL):
+    options = model_options.get(name, {})
+    return options.get('conf', DEFAULT_CONF), options.get('iou', DEFAULT_IOU)
+
+
+def file_identity(path):
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path, None, None
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def model_source(name=DEFAULT_MODEL):
+    # identifies custom weights and local hub repos, None for the default pretrained model;
+    # size and mtime make a retrained file at the same path a different source
+    options = model_options.get(name, {})
+    weights, repo = options.get('weights'), options.get('repo')
+    if weights is None and repo is None:
+        return None
+    return (None if weights is None else file_identity(weights),
+            None if repo is None else os.path.abspath(repo))
+
+
+def get_model(name=DEFAULT_MODEL):
+    model = loaded_models.get(name)
+    if model is not None:
+        return model
+    check_name(name)
+    with load_lock:
+        if name not in loaded_models:
+            options = model_options.get(name, {})
+            if torch_threads is not None:
+                import torch
+                torch.set_num_threads(torch_threads)
+            model = MODEL_LOADERS[name](weights=options.get('weights'), repo=options.get('repo'))
+            model.conf, model.iou = model_thresholds(name)
+            loaded_models[name] = model
+    return loaded_models[name]
+
+
+def preload(name=DEFAULT_MODEL, **options):
+    if options:
+        configure_model(name, **options)
+    return get_model(name)
+
+
+def is_loaded(name=DEFAULT_MODEL):
+    return name in loaded_models
@@ -0,0 +1,144 @@
+import numpy as np
+
+# MOTChallenge text files, gt.txt and det.txt alike:
+#   frame, id, left, top, width, height, conf, x, y, z            (MOT15, 10 columns)
+#   frame, id, left, top, width, height, conf, class, visibility  (MOT16/17/20 gt, 9 columns)
+# A file is read in one vectorized pass into columns sorted by frame, plus an offsets
+# array so that any frame is a slice of the columns: no per-row or per-box Python objects.
+
+
+class MOTTable:
+    def __init__(self, frames, ids, boxes, confidence, classes, visibility, num_frames=None):
+        # frames are 0-based here; boxes are float (N, 4) [xmin, ymin, xmax, ymax]
+        if len(frames) and np.any(frames[1:] < frames[:-1]):
+            order = np.argsort(frames, kind='stable')
+            frames, ids, boxes = frames[order], ids[order], boxes[order]
+            confidence, classes, visibility = confidence[order], classes[order], visibility[order]
+        # [id, xmin, ymin, xmax, ymax] rows, the layout trackers and metrics use;
+        # boxes is a view into them
+        self.rows = np.empty((len(frames), 5))
+        self.rows[:, 0] = ids
+        self.rows[:, 1:] = boxes
+        self.frames = frames
+        self.ids = ids
+        self.boxes = self.rows[:, 1:]
+        self.confidence = confidence
+        self.classes = classes
+        self.visibility = visibility
+        if num_frames is None:
+            num_frames = int(frames[-1]) + 1 if len(frames) else 0
+        self.num_frames = num_frames
+        self.offsets = np.searchsorted(frames, np.arange(num_frames + 1))
+
+    def __len__(self):
+        return self.num_frames
+
+    def row_range(self, frame_index):
+        if not 0 <= frame_index < self.num_frames:
+            return 0, 0
+        return int(self.offsets[frame_index]), int(self.offsets[frame_index + 1])
+
+    def frame(self, frame_index):
+        # view of the (N, 5) rows of one frame
+        start, end = self.row_range(frame_index)
+        return self.rows[start:end]
+
+    def __getitem__(self, frame_index):
+        if isinstance(frame_index, slice):
+            return [self.frame(k) for k in range(*frame_index.indices(self.num_frames))]
+        if frame_index < 0:
+            frame_index += self.num_frames
+        return self.frame(frame_index)
+
+    def __iter__(self):
+        for frame_index in range(self.num_frames):
+            yield self.frame(frame_index)
+
+    def select(self, mask):
+        # subset of the rows; the frame count stays, so frame numbers keep their meaning
+        return MOTTable(self.frames[mask], self.ids[mask], self.boxes[mask], self.confidence[mask],
+                        self.classes[mask], self.visibility[mask], self.num_frames)
+
+
+def read_columns(path):
+    with open(path) as f:
+        first = f.readline()
+    if not first.strip():
+        return np.empty((0, 10))
+    return np.loadtxt(path, delimiter=',', ndmin=2, usecols=range(min(10, first.count(',') + 1)))
+
+
+def load_mot(path, min_confidence=None, classes=None, min_visibility=None, active_only=False,
+             first_frame=1, num_frames=None):
+    # active_only drops gt rows whose conf/flag column is 0 ("ignore" in MOT16+ ground truth)
+    data = read_columns(path)
+    count = len(data)
+    confidence = data[:, 6] if data.shape[1] > 6 else np.ones(count)
+    if data.shape[1] == 9:
+        object_classes, visibility = data[:, 7].astype(np.int64), data[:, 8]
+    else:
+        object_classes, visibility = np.full(count, -1, dtype=np.int64), np.ones(count)
+    if num_frames is None:
+        num_frames = int(data[:, 0].max()) - first_frame + 1 if count else 0
+
+    # filter before anything is sorted or copied
+    mask = np.ones(count, dtype=bool)
+    if min_confidence is not None:
+        mask &= confidence >= min_confidence
+    if active_only:
+        mask &= confidence > 0
+    if classes is not None:
+        mask &= np.isin(object_classes, list(classes))
+    if min_visibility is not None:
+        mask &= visibility >= min_visibility
+    if not mask.all():
+        data, confidence = data[mask], confidence[mask]
+        object_classes, visibility = object_classes[mask], visibility[mask]
+
+    # copies, so that the parsed text columns can be freed
+    confidence, visibility = np.ascontiguousarray(confidence), np.ascontiguousarray(visibility)
+    boxes = data[:, 2:6].copy()
+    boxes[:, 2:] += boxes[:, :2]
+    return MOTTable(data[:, 0].astype(np.int64) - first_frame, data[:, 1].astype(np.int64), boxes,
+                    confidence, object_classes, visibility, num_frames)
+
+
+# Streams tracker output as MOTChallenge rows, one vectorized write per frame:
+#   frame, id, left, top, width, height, conf, -1, -1, -1
+class MOTWriter:
+    def __init__(self, path, first_frame=1):
+        self.path = path
+        self.first_frame = first_frame
+        self.file = open(path, 'w')
+        self.rows = 0
+
+    def write(self, frame_index, detections):
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 5)
+        if not len(detections):
+            return
+        rows = np.empty((len(detections), 10))
+        rows[:, 0] = frame_index + self.first_frame
+        rows[:, 1] = detections[:, 0]
+        rows[:, 2:4] = detections[:, 1:3]
+        rows[:, 4:6] = detections[:, 3:5] - detections[:, 1:3]
+        rows[:, 6] = 1
+        rows[:, 7:] = -1
+        np.savetxt(self.file, rows, fmt='%d,%d,%.2f,%.2f,%.2f,%.2f,%g,%d,%d,%d')
+        self.rows += len(rows)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def write_mot(path, hypotheses, first_frame=1):
+    with MOTWriter(path, first_frame) as writer:
+        for frame_index, detections in enumerate(hypotheses):
+            writer.write(frame_index, detections)
+    return path
@@ -0,0 +1,67 @@
+import numpy as np
+
+DIAGONAL = np.arange(4)
+
+
+def noise_sizes(sizes):
+    # boxes truncated to zero width or height (downscaled frames, det.txt) would get zero
+    # noise and a singular innovation covariance, so noise is never below that of a 1 px box
+    return np.maximum(np.asarray(sizes, dtype=np.float64), 1.0)
+
+
+# Constant-velocity Kalman filter over box centers, one row per track:
+# state (N, 4) = [cx, cy, vx, vy] in pixels and pixels per frame, covariance (N, 4, 4).
+# Every method works on all the given tracks at once. Noise is relative to the box size
+# (as in DeepSORT), so one setting fits both small pedestrians and large cars.
+class KalmanFilter:
+    def __init__(self, position_noise=1 / 20, velocity_noise=1 / 160, measurement_noise=1 / 20):
+        self.position_noise = position_noise
+        self.velocity_noise = velocity_noise
+        self.measurement_noise = measurement_noise
+
+    def initiate(self, centers, sizes):
+        sizes = noise_sizes(sizes)
+        state = np.zeros((len(centers), 4))
+        state[:, :2] = centers
+        std = np.hstack([2 * self.position_noise * sizes, 10 * self.velocity_noise * sizes])
+        covariance = np.zeros((len(centers), 4, 4))
+        covariance[:, DIAGONAL, DIAGONAL] = std ** 2
+        return state, covariance
+
+    @staticmethod
+    def project(state, steps):
+        # centers `steps` frames ahead, without touching the covariance
+        return state[:, :2] + state[:, 2:] * np.asarray(steps, dtype=np.float64)[:, None]
+
+    def predict(self, state, covariance, sizes, steps):
+        steps = np.asarray(steps, dtype=np.float64)
+        sizes = noise_sizes(sizes)
+        transition = np.tile(np.eye(4), (len(state), 1, 1))
+        transition[:, 0, 2] = steps
+        transition[:, 1, 3] = steps
+        state = np.einsum('nij,nj->ni', transition, state)
+        covariance = transition @ covariance @ transition.transpose(0, 2, 1)
+        std = np.hstack([self.position_noise * sizes, self.velocity_noise * sizes])
+        covariance[:, DIAGONAL, DIAGONAL] += std ** 2 * steps[:, None]
+        return state, covariance
+
+    def update(self, state, covariance, centers, sizes):
+        # only the center is measured, so the innovation covariance is the top-left 2x2 block
+        sizes = noise_sizes(sizes)
+        innovation_cov = covariance[:, :2, :2].copy()
+        innovation_cov[:, [0, 1], [0, 1]] += (self.measurement_noise * sizes) ** 2
+        gain = covariance[:, :, :2] @ np.linalg.inv(innovation_cov)
+        state = state + np.einsum('nij,nj->ni', gain, centers - state[:, :2])
+        covariance = covariance - gain @ covariance[:, :2, :]
+        return state, covariance
+
+
+MOTION_MODELS = (None, 'kalman')
+
+
+def make_motion(motion):
+    if motion is None or isinstance(motion, KalmanFilter):
+        return motion
+    if motion == 'kalman':
+        return KalmanFilter()
+    raise ValueError(f"Unknown motion model {motion!r}, expected one of {MOTION_MODELS}")
@@ -0,0 +1,201 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import PrefetchedDetector, is_key_frame
+from profiling import LatencyHistogram
+
+
+class BatchedDetector:
+    # Collects detection requests from all streams and runs them as one batch when
+    # max_batch frames are waiting, when every stream that can submit is waiting, or when
+    # the oldest request has waited out the deadline. The deadline is at least the measured
+    # cost of one batch: a shorter wait only splits streams that would have joined, and the
+    # early batch delays the next one by that cost anyway. For the same reason a deadline
+    # that expires while a batch is running waits for it to finish, requests arriving
+    # meanwhile join. Streams that wait for a shared batch fall into step, so their later
+    # key frames arrive together as well.
+    # Inference runs on its own thread so the event loop keeps accepting frames meanwhile.
+    def __init__(self, detect_batch=None, max_batch=16, max_latency=0.02):
+        if detect_batch is None:
+            from detection import extract_detections_batch as detect_batch
+        self.detect_batch = detect_batch
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='detector')
+        self.pending = []
+        self.timer = None
+        # running totals only, a server may run for days
+        self.batches = 0
+        self.batched_frames = 0
+        # number of streams that can submit, None when unknown
+        self.expected = None
+        self.batch_cost = None
+        self.busy = 0.0
+        self.running = 0
+        self.overdue = False
+
+    def deadline(self):
+        if self.batch_cost is None:
+            return self.max_latency
+        return max(self.max_latency, self.batch_cost)
+
+    def ready(self):
+        waiting = len(self.pending)
+        return waiting >= self.max_batch or (self.expected is not None and waiting >= self.expected)
+
+    async def detect(self, frame, min_confidence=0.5, labels=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((frame, min_confidence, None if labels is None else tuple(labels), future))
+        if self.ready():
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.deadline(), self.expire)
+        return await future
+
+    def expire(self):
+        self.timer = None
+        if self.running:
+            self.overdue = True
+        else:
+            self.flush()
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.overdue = False
+        pending, self.pending = self.pending, []
+        # one inference call per distinct (min_confidence, labels), usually one or two
+        groups = {}
+        for frame, min_confidence, labels, future in pending:
+            groups.setdefault((min_confidence, labels), []).append((frame, future))
+        loop = asyncio.get_running_loop()
+        for (min_confidence, labels), requests in groups.items():
+            self.batches += 1
+            self.batched_frames += len(requests)
+            self.running += 1
+            frames = [frame for frame, _ in requests]
+            futures = [future for _, future in requests]
+            task = loop.run_in_executor(self.executor, self.run_batch, frames, min_confidence, labels)
+            task.add_done_callback(lambda task, futures=futures: self.finish(task, futures))
+
+    def run_batch(self, frames, min_confidence, labels):
+        started = time.perf_counter()
+        detections = self.detect_batch(frames, min_confidence=min_confidence,
+                                       labels=None if labels is None else list(labels))
+        cost = time.perf_counter() - started
+        self.busy += cost
+        # exponential average, batch sizes and therefore costs drift as streams come and go
+        self.batch_cost = cost if self.batch_cost is None else 0.8 * self.batch_cost + 0.2 * cost
+        return detections
+
+    def finish(self, task, futures):
+        self.running -= 1
+        self.resolve(task, futures)
+        if self.pending and (self.overdue or self.ready()):
+            self.flush()
+
+    @staticmethod
+    def resolve(task, futures):
+        error = task.exception()
+        for k, future in enumerate(futures):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(task.result()[k])
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class Stream:
+    def __init__(self, tracker, detector):
+        self.tracker = tracker
+        self.detector = detector
+        self.lock = asyncio.Lock()
+        self.frames = 0
+        # per-frame latency in nanoseconds, bounded log-linear buckets
+        self.latency = LatencyHistogram()
+
+
+# Many independent tracker states behind one asyncio API. Key frames of fixed-rate
+# trackers are detected through the shared BatchedDetector before the tracker step, the
+# correlation step itself runs on a thread pool. Frames of one stream are processed in
+# submission order; different streams proceed independently.
+class MultiStreamTracker:
+    def __init__(self, make_tracker=None, detect_batch=None, max_batch=16, max_latency=0.02,
+                 workers=4):
+        if make_tracker is None:
+            from cross_correlation import CorrelationTracker
+            make_tracker = CorrelationTracker
+        self.make_tracker = make_tracker
+        self.batcher = BatchedDetector(detect_batch, max_batch=max_batch, max_latency=max_latency)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tracker')
+        self.streams = {}
+        self.loop = None
+
+    def detect_inline(self, frame, min_confidence=0.5, labels=None):
+        # called from a tracker thread when the detection was not prefetched (adaptive schedules)
+        request = self.batcher.detect(frame, min_confidence=min_confidence, labels=labels)
+        return asyncio.run_coroutine_threadsafe(request, self.loop).result()
+
+    def add_stream(self, stream_id, tracker=None):
+        if tracker is None:
+            tracker = self.make_tracker(return_images=False)
+        tracker.return_images = False
+        detector = PrefetchedDetector(self.detect_inline)
+        tracker.detector = detector
+        self.streams[stream_id] = Stream(tracker, detector)
+        self.batcher.expected = len(self.streams)
+        return tracker
+
+    def close_stream(self, stream_id):
+        tracker = self.streams.pop(stream_id).tracker
+        self.batcher.expected = len(self.streams)
+        # the streams left waiting may now be all there is
+        if self.batcher.pending and self.batcher.ready() and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.batcher.flush)
+        return tracker
+
+    async def submit_frame(self, stream_id, frame):
+        self.loop = asyncio.get_running_loop()
+        if stream_id not in self.streams:
+            self.add_stream(stream_id)
+        stream = self.streams[stream_id]
+        async with stream.lock:
+            started = time.perf_counter()
+            tracker = stream.tracker
+            prepared = frame
+            if tracker.process_scale != 1.0:
+                prepared = await self.loop.run_in_executor(self.executor, tracker.prepare_frame, frame)
+            if is_key_frame(tracker, tracker.frame_index):
+                labels = None if tracker.frame_index == 0 else tracker.labels
+                detections = await self.batcher.detect(prepared, labels=labels)
+                stream.detector.set(prepared, labels, detections)
+            detections = await self.loop.run_in_executor(self.executor, tracker.update_frame,
+                                                         frame, prepared)
+            stream.frames += 1
+            stream.latency.record((time.perf_counter() - started) * 1e9)
+            return detections
+
+    def stats(self):
+        batcher = self.batcher
+        latency = LatencyHistogram()
+        for stream in self.streams.values():
+            latency.merge(stream.latency)
+        return {
+            'detector_busy_s': batcher.busy,
+            'streams': len(self.streams),
+            'frames': sum(stream.frames for stream in self.streams.values()),
+            'batches': batcher.batches,
+            'mean_batch': batcher.batched_frames / batcher.batches if batcher.batches else 0.0,
+            'p50_ms': latency.percentile(50) * 1e-6,
+            'p99_ms': latency.percentile(99) * 1e-6,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.batcher.close()
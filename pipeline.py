@@ -0,0 +1,219 @@
+import queue
+import threading
+import time
+from detection import draw_detections, extract_detections
+from detection_provider import seek
+
+END = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy = 0.0
+        self.wait = 0.0
+        self.max_latency = 0.0
+
+    def record(self, busy, wait):
+        self.count += 1
+        self.busy += busy
+        self.wait += wait
+        self.max_latency = max(self.max_latency, busy)
+
+    def summary(self):
+        return {
+            'frames': self.count,
+            'busy_s': self.busy,
+            'wait_s': self.wait,
+            'fps': self.count / self.busy if self.busy else 0.0,
+            'mean_ms': 1000 * self.busy / self.count if self.count else 0.0,
+            'max_ms': 1000 * self.max_latency,
+        }
+
+
+def is_key_frame(tracker, frame_index):
+    # only fixed-rate schedules can be predicted; adaptive ones detect inline
+    if frame_index == 0 or not hasattr(tracker, 'scheduler'):
+        return True
+    detection_rate = getattr(tracker.scheduler, 'detection_rate', None)
+    return detection_rate is not None and frame_index % detection_rate == 0
+
+
+class PrefetchedDetector:
+    # detector passed to the tracker: returns what the detect stage computed for the
+    # frame if the labels agree, otherwise runs the detector inline
+    def __init__(self, detect=extract_detections):
+        self.detect = detect
+        self.frame = None
+        self.labels = None
+        self.detections = None
+
+    def set(self, frame, labels, detections):
+        self.frame = frame
+        self.labels = labels
+        self.detections = detections
+
+    def __call__(self, frame, min_confidence=0.5, labels=None):
+        if frame is self.frame and self.detections is not None and labels == self.labels:
+            detections, self.detections = self.detections, None
+            return detections
+        return self.detect(frame, min_confidence=min_confidence, labels=labels)
+
+    def seek(self, frame_index):
+        seek(self.detect, frame_index)
+
+    @property
+    def source_coordinates(self):
+        return getattr(self.detect, 'source_coordinates', False)
+
+
+# decode -> detect -> track -> render -> encode, one thread per stage joined by bounded
+# queues: a slow stage blocks the ones before it instead of buffering the whole video,
+# and every stage sees frames in order, which keeps the tracker state consistent
+class Pipeline:
+    STAGES = ('decode', 'detect', 'track', 'render', 'encode')
+
+    def __init__(self, tracker, queue_size=8, detect=None):
+        self.tracker = tracker
+        self.tracker.return_images = False
+        self.queue_size = queue_size
+        self.detect = tracker.detector if detect is None else detect
+        self.detector = PrefetchedDetector(self.detect)
+        self.tracker.detector = self.detector
+        self.stats = {name: StageStats(name) for name in self.STAGES}
+        self.stop = threading.Event()
+        self.errors = []
+        self.wall_time = 0.0
+
+    def is_key_frame(self, frame_index):
+        return is_key_frame(self.tracker, frame_index)
+
+    def put(self, out_queue, item):
+        while not self.stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, in_queue):
+        while not self.stop.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return END
+
+    def run_stage(self, name, work, in_queue, out_queue):
+        stats = self.stats[name]
+        try:
+            while True:
+                started = time.perf_counter()
+                item = self.get(in_queue)
+                if item is END:
+                    break
+                ready = time.perf_counter()
+                result = work(item)
+                done = time.perf_counter()
+                stats.record(done - ready, ready - started)
+                if out_queue is not None and not self.put(out_queue, result):
+                    return
+        except Exception as error:
+            self.errors.append(error)
+            self.stop.set()
+            return
+        if out_queue is not None:
+            self.put(out_queue, END)
+
+    def decode(self, frames, out_queue):
+        stats = self.stats['decode']
+        try:
+            started = time.perf_counter()
+            for frame_index, frame in enumerate(frames):
+                decoded = time.perf_counter()
+                stats.record(decoded - started, 0.0)
+                if not self.put(out_queue, (frame_index, frame, None)):
+                    return
+                started = time.perf_counter()
+        except Exception as error:
+            self.errors.append(error)
+            self.stop.set()
+            return
+        self.put(out_queue, END)
+
+    def detect_stage(self, item):
+        # the frame is brought to the processing resolution here, once, for both stages
+        frame_index, frame, _ = item
+        prepared = self.tracker.prepare_frame(frame)
+        if not self.is_key_frame(frame_index):
+            return frame_index, frame, (prepared, None)
+        labels = None if frame_index == 0 else self.tracker.labels
+        seek(self.detect, frame_index)
+        return frame_index, frame, (prepared, (labels, self.detect(prepared, labels=labels)))
+
+    def track_stage(self, item):
+        frame_index, frame, (prepared, prefetched) = item
+        if prefetched is not None:
+            self.detector.set(prepared, *prefetched)
+        return frame_index, frame, self.tracker.update_frame(frame, prepared)
+
+    def render_stage(self, item):
+        frame_index, frame, detections = item
+        return draw_detections(frame, detections)
+
+    def run(self, frames, write_frame):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.STAGES) - 1)]
+        threads = [
+            threading.Thread(target=self.decode, args=(frames, queues[0])),
+            threading.Thread(target=self.run_stage, args=('detect', self.detect_stage, queues[0], queues[1])),
+            threading.Thread(target=self.run_stage, args=('track', self.track_stage, queues[1], queues[2])),
+            threading.Thread(target=self.run_stage, args=('render', self.render_stage, queues[2], queues[3])),
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        # encoding stays on the calling thread, the writer is not thread-safe
+        self.run_stage('encode', write_frame, queues[3], None)
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        self.wall_time = time.perf_counter() - started
+        if self.errors:
+            raise self.errors[0]
+        return self.summary()
+
+    def summary(self):
+        frames = self.stats['encode'].count
+        return {
+            'frames': frames,
+            'wall_s': self.wall_time,
+            'fps': frames / self.wall_time if self.wall_time else 0.0,
+            'stages': {name: stats.summary() for name, stats in self.stats.items()},
+        }
+
+
+def print_summary(summary):
+    print(f"{'Этап':<8} {'Кадров':>7} {'Кадр/с':>8} {'Сред. мс':>9} {'Макс. мс':>9} {'Ожид. с':>8}")
+    for name, stage in summary['stages'].items():
+        print(f"{name:<8} {stage['frames']:>7} {stage['fps']:>8.1f} {stage['mean_ms']:>9.1f} "
+              f"{stage['max_ms']:>9.1f} {stage['wait_s']:>8.2f}")
+    print(f"Итого: {summary['frames']} кадров за {summary['wall_s']:.2f} с "
+          f"({summary['fps']:.2f} кадр/с)")
+
+
+def run_video_pipeline(tracker, input_video, output_video, queue_size=8, fps=25,
+                       codec='libx264', preset='medium'):
+    from moviepy.editor import VideoFileClip
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+    clip = VideoFileClip(input_video)
+    writer = FFMPEG_VideoWriter(output_video, clip.size, fps, codec=codec, preset=preset,
+                                ffmpeg_params=['-pix_fmt', 'yuv420p'])
+    try:
+        summary = Pipeline(tracker, queue_size=queue_size).run(clip.iter_frames(), writer.write_frame)
+    finally:
+        writer.close()
+        clip.close()
+    return summary
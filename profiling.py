@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import time
+
+SUB_BUCKET_BITS = 7
+
+
+class LatencyHistogram:
+    # log-linear (HDR-style) buckets over nanoseconds: each power of two is split into
+    # 2 ** (SUB_BUCKET_BITS - 1) buckets, so recorded values keep ~1% relative precision
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        value = max(0, int(value))
+        shift = max(0, value.bit_length() - SUB_BUCKET_BITS)
+        key = (shift, value >> shift)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        rank = max(1, int(round(q / 100 * self.count)))
+        seen = 0
+        for (shift, mantissa), count in sorted(self.buckets.items()):
+            seen += count
+            if seen >= rank:
+                return min(self.max, (mantissa << shift) + ((1 << shift) >> 1))
+        return self.max
+
+    def summary(self, scale=1e-6):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'total': self.total * scale,
+            'mean': self.total / self.count * scale,
+            'min': self.min * scale,
+            'p50': self.percentile(50) * scale,
+            'p90': self.percentile(90) * scale,
+            'p99': self.percentile(99) * scale,
+            'p999': self.percentile(99.9) * scale,
+            'max': self.max * scale,
+        }
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class NullProfiler:
+    enabled = False
+
+    def stage(self, name):
+        return NULL_STAGE
+
+    def count(self, name, n=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, trace=False, max_trace_events=1_000_000):
+        self.latencies = {}
+        self.counters = {}
+        self.values = {}
+        self.hooks = []
+        self.trace = trace
+        self.max_trace_events = max_trace_events
+        self.events = []
+        self.origin = time.perf_counter_ns()
+        self.lock = threading.Lock()
+
+    def add_hook(self, hook):
+        # hook(name, start_ns, end_ns) is called after every timed stage
+        self.hooks.append(hook)
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def record(self, name, start, end):
+        with self.lock:
+            histogram = self.latencies.get(name)
+            if histogram is None:
+                histogram = self.latencies[name] = LatencyHistogram()
+            histogram.record(end - start)
+            if self.trace and len(self.events) < self.max_trace_events:
+                self.events.append((name, start, end, threading.get_ident()))
+        for hook in self.hooks:
+            hook(name, start, end)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        with self.lock:
+            histogram = self.values.get(name)
+            if histogram is None:
+                histogram = self.values[name] = LatencyHistogram()
+            histogram.record(value)
+
+    def summary(self):
+        return {
+            'latency_ms': {name: histogram.summary() for name, histogram in self.latencies.items()},
+            'counters': dict(self.counters),
+            'values': {name: histogram.summary(scale=1) for name, histogram in self.values.items()},
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_chrome_trace(self, path):
+        # chrome://tracing / Perfetto "X" (complete) events, timestamps in microseconds
+        events = [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                   'ts': (start - self.origin) / 1000, 'dur': (end - start) / 1000}
+                  for name, start, end, tid in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def print_summary(self):
+        print(f"{'Этап':<18} {'Вызовов':>8} {'Сред. мс':>9} {'p50':>8} {'p99':>8} {'Макс.':>8}")
+        for name, stats in sorted(self.summary()['latency_ms'].items()):
+            print(f"{name:<18} {stats['count']:>8} {stats['mean']:>9.2f} {stats['p50']:>8.2f} "
+                  f"{stats['p99']:>8.2f} {stats['max']:>8.2f}")
+        for name, value in sorted(self.counters.items()):
+            print(f"{name:<18} {value:>8}")
+
+
+def make_profiler(profile_path=None, trace_path=None):
+    if profile_path is None and trace_path is None:
+        return NULL_PROFILER
+    return Profiler(trace=trace_path is not None)
+
+
+def labelled_path(path, label):
+    # profile.json -> profile.demo.json, for runs that keep one profiler per part
+    if path is None:
+        return None
+    root, ext = os.path.splitext(path)
+    return f"{root}.{label}{ext}"
+
+
+def save_profile(profiler, profile_path=None, trace_path=None, title=None):
+    if not profiler.enabled:
+        return
+    if title:
+        print(f"\nПрофиль: {title}")
+    profiler.print_summary()
+    if profile_path:
+        profiler.write_json(profile_path)
+    if trace_path:
+        profiler.write_chrome_trace(trace_path)
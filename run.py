@@ -1,18 +1,29 @@
 
 import os
 import argparse
-from moviepy.editor import VideoFileClip
 from cross_correlation import CorrelationTracker
-from metrics import motp_mota
+from detection import SharedDetector, enable_detection_cache, use_model
+from metrics import MOTAccumulator
+from frame_source import VideoSource
+from config import DEFAULT_MODEL
+from models import MODEL_LOADERS, preload, set_num_threads
+from pipeline import print_summary, run_video_pipeline
+from profiling import labelled_path, make_profiler, save_profile
 
-def run_demo(input_video, output_video, detection_rate=5):
+def run_demo(input_video, output_video, detection_rate=5, pipelined=False, profiler=None, process_scale=1.0):
     print(f"\n" + "="*40)
     print(f"   ЗАПУСК ШАГА 1: ДЕМОНСТРАЦИЯ (Видео)")
     print(f"="*40)
     print(f"Входной файл: {input_video}")
     print(f"Сохранение в: {output_video}")
     print(f"Детектор срабатывает каждые {detection_rate} кадров")
-    tracker = CorrelationTracker(detection_rate=detection_rate)
+    tracker = CorrelationTracker(detection_rate=detection_rate, profiler=profiler, process_scale=process_scale)
+    if pipelined:
+        summary = run_video_pipeline(tracker, input_video, output_video, fps=25)
+        print_summary(summary)
+        print(f"Видео готово!")
+        return
+    from moviepy.editor import VideoFileClip
     input_clip = VideoFileClip(input_video)
     output_clip = input_clip.fl_image(tracker.update_frame)
     output_clip.write_videofile(
@@ -28,35 +39,36 @@ def run_demo(input_video, output_video, detection_rate=5):
     print(f"Видео готово!")
 
 
-def run_evaluation(video_path, rate_fast=5):
+def run_evaluation(video_path, rate_fast=5, profiler=None):
+    rates = [rate_fast] if isinstance(rate_fast, int) else list(rate_fast)
     print(f"\n" + "="*40)
     print(f"   ЗАПУСК ШАГА 2: ОЦЕНКА КАЧЕСТВА (Метрики)")
     print(f"="*40)
     if not os.path.exists(video_path):
         print(f"ОШИБКА: Видео {video_path} не найдено!")
         return
-    print("--> Генерация 'Эталона' (Запуск нейросети на каждом кадре)...")
-    tracker_gt = CorrelationTracker(detection_rate=1)
-    tracker_gt.return_images = False 
-    clip = VideoFileClip(video_path)
-    ground_truth = []
-    for frame in clip.iter_frames():
-        detections = tracker_gt.update_frame(frame)
-        ground_truth.append(detections)
-    print(f"--> Генерация 'Гипотезы' (Запуск нейросети раз в {rate_fast} кадр(ов))...")
-    tracker_fast = CorrelationTracker(detection_rate=rate_fast)
-    tracker_fast.return_images = False
-    hypotheses = []
-    for frame in clip.iter_frames():
-        detections = tracker_fast.update_frame(frame)
-        hypotheses.append(detections)
-    print("--> Подсчет метрик...")
-    motp, mota = motp_mota(ground_truth, hypotheses, threshold=0.5)
+    print("--> 'Эталон' (нейросеть на каждом кадре) и 'Гипотезы' "
+          f"(нейросеть раз в {', '.join(map(str, rates))} кадр(ов)) за один проход...")
+    detector = SharedDetector()
+    tracker_gt = CorrelationTracker(detection_rate=1, return_images=False, detector=detector)
+    trackers = {rate: CorrelationTracker(detection_rate=rate, return_images=False, detector=detector,
+                                         profiler=profiler)
+                for rate in rates}
+    accumulators = {rate: MOTAccumulator(threshold=0.5) for rate in rates}
+    frame_count = 0
+    for frame in VideoSource(video_path):
+        ground_truth = tracker_gt.update_frame(frame)
+        for rate, tracker in trackers.items():
+            accumulators[rate].update(ground_truth, tracker.update_frame(frame))
+        frame_count += 1
+    print(f"--> Кадров: {frame_count}, запусков нейросети: {detector.calls}")
     print("\n" + "="*30)
-    print(f"ИТОГОВЫЙ ОТЧЕТ (Detection Rate = {rate_fast})")
+    print(f"ИТОГОВЫЙ ОТЧЕТ")
     print("="*30)
-    print(f"MOTA (Качество трекинга): {mota:.4f}")
-    print(f"MOTP (Точность рамок):    {motp:.4f}")
+    print(f"{'Rate':>6} {'MOTA':>8} {'MOTP':>8}")
+    for rate in rates:
+        summary = accumulators[rate].compute()
+        print(f"{rate:>6} {summary['mota']:>8.4f} {summary['motp']:>8.4f}")
     print("="*30 + "\n")
 
 if __name__ == "__main__":
@@ -70,16 +82,66 @@ if __name__ == "__main__":
     parser.add_argument('--rate', type=int, default=5,
                         help="Как часто запускать SSD (раз в N кадров)")
 
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Демо в потоковом режиме: декодирование, детекция, трекинг, "
+                             "отрисовка и кодирование в отдельных потоках")
+
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Масштаб кадра для детекции и корреляции в демо (рамки рисуются "
+                             "в исходном разрешении)")
+
+    parser.add_argument('--eval-rates', type=int, nargs='+', default=None,
+                        help="Значения --rate для оценки за один проход (по умолчанию --rate)")
+
+    parser.add_argument('--cache-dir', type=str, default='.detection_cache',
+                        help="Папка кэша детекций ('' — без кэша)")
+
+    parser.add_argument('--cache-size-mb', type=int, default=1024,
+                        help="Максимальный размер кэша детекций (МБ)")
+
+    parser.add_argument('--profile', type=str, default=None,
+                        help="Сохранить JSON-сводку задержек по этапам в файл")
+
+    parser.add_argument('--trace', type=str, default=None,
+                        help="Сохранить Chrome trace (chrome://tracing) в файл")
+
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL, choices=sorted(MODEL_LOADERS),
+                        help="Модель детектора (загружается при первом запуске нейросети)")
+
+    parser.add_argument('--weights', type=str, default=None,
+                        help="Локальный файл весов модели (без загрузки из сети)")
+
+    parser.add_argument('--hub-repo', type=str, default=None,
+                        help="Локальная копия репозитория ultralytics/yolov5 для torch.hub")
+
+    parser.add_argument('--preload', action='store_true',
+                        help="Загрузить модель сразу, а не при первой детекции")
+
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Потоков torch для инференса (по умолчанию — решает torch)")
+
     args = parser.parse_args()
+    set_num_threads(args.threads)
+    use_model(args.model, weights=args.weights, repo=args.hub_repo)
+    if args.preload:
+        preload(args.model)
+    if args.cache_dir:
+        enable_detection_cache(args.cache_dir, max_bytes=args.cache_size_mb << 20)
     dir_name = os.path.dirname(args.video)
     if not dir_name: dir_name = "."
     base_name = os.path.basename(args.video)
     name_no_ext = os.path.splitext(base_name)[0]
     output_path = os.path.join(dir_name, f"{name_no_ext}_result.mp4")
-    if args.mode == 'all':
-        run_demo(args.video, output_path, args.rate)
-        run_evaluation(args.video, args.rate)
-    elif args.mode == 'demo':
-        run_demo(args.video, output_path, args.rate)
-    elif args.mode == 'eval':
-        run_evaluation(args.video, args.rate)
\ No newline at end of file
+    modes = ['demo', 'eval'] if args.mode == 'all' else [args.mode]
+    for mode in modes:
+        # one profiler per mode: the demo and the evaluation run different trackers, a shared
+        # summary would mix their stages; in 'all' mode the files get a .demo/.eval suffix
+        profile_path, trace_path = args.profile, args.trace
+        if len(modes) > 1:
+            profile_path, trace_path = labelled_path(profile_path, mode), labelled_path(trace_path, mode)
+        profiler = make_profiler(profile_path, trace_path)
+        if mode == 'demo':
+            run_demo(args.video, output_path, args.rate, args.pipeline, profiler, args.scale)
+        else:
+            run_evaluation(args.video, args.eval_rates or args.rate, profiler)
+        save_profile(profiler, profile_path, trace_path, title=mode if len(modes) > 1 else None)
@@ -0,0 +1,90 @@
+from collections import deque
+import numpy as np
+
+
+def peak_sharpness(weighted):
+    # peak-to-sidelobe ratio of the Gaussian-weighted response
+    std = weighted.std()
+    if std <= np.finfo(np.float64).eps:
+        return 0.0
+    return float((weighted.max() - weighted.mean()) / std)
+
+
+def frame_signals(track_signals):
+    # per-track (peak, sharpness, displacement) -> the worst value of each for the frame
+    if not track_signals:
+        return None
+    peaks, sharpness, displacement = np.array(track_signals, dtype=np.float64).T
+    return {
+        'tracks': len(track_signals),
+        'peak': float(peaks.min()),
+        'sharpness': float(sharpness.min()),
+        'displacement': float(displacement.max()),
+    }
+
+
+class FixedRateScheduler:
+    def __init__(self, detection_rate=5):
+        self.detection_rate = detection_rate
+        self.calls = 0
+
+    def should_detect(self, frame_index, signals):
+        return frame_index % self.detection_rate == 0
+
+    def record_detection(self, frame_index):
+        self.calls += 1
+
+
+class AdaptiveScheduler:
+    # detects when the correlation tracker looks unreliable (weak or flat peaks, large
+    # jumps), never more often than min_interval, at least every max_interval frames
+    # and at most max_per_second times per second of video
+    def __init__(self, min_interval=3, max_interval=7, min_peak=0.6, min_sharpness=5.0,
+                 max_displacement=0.2, max_per_second=None, fps=25):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_peak = min_peak
+        self.min_sharpness = min_sharpness
+        self.max_displacement = max_displacement
+        self.max_per_second = max_per_second
+        self.fps = fps
+        self.last_detection = None
+        self.recent = deque()
+        self.calls = 0
+
+    def over_budget(self, frame_index):
+        if self.max_per_second is None:
+            return False
+        while self.recent and self.recent[0] <= frame_index - self.fps:
+            self.recent.popleft()
+        return len(self.recent) >= self.max_per_second
+
+    def should_detect(self, frame_index, signals):
+        if self.last_detection is None:
+            return True
+        since = frame_index - self.last_detection
+        if since < self.min_interval or self.over_budget(frame_index):
+            return False
+        if since >= self.max_interval:
+            return True
+        if signals is None:
+            return False
+        return (signals['peak'] < self.min_peak
+                or signals['sharpness'] < self.min_sharpness
+                or signals['displacement'] > self.max_displacement)
+
+    def record_detection(self, frame_index):
+        self.last_detection = frame_index
+        self.recent.append(frame_index)
+        self.calls += 1
+
+
+def make_scheduler(scheduler, detection_rate=5):
+    if scheduler is None or scheduler == 'fixed':
+        return FixedRateScheduler(detection_rate)
+    if scheduler == 'adaptive':
+        return AdaptiveScheduler(min_interval=max(1, detection_rate - 2),
+                                 max_interval=detection_rate + 2)
+    if isinstance(scheduler, str):
+        raise ValueError(f"Unknown scheduler {scheduler!r}, expected 'fixed' or 'adaptive'")
+    return scheduler
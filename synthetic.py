@@ -0,0 +1,59 @@
+import numpy as np
+
+# Procedural test video: textured boxes moving at constant velocity over a static noise
+# background, bouncing off the borders. Everything is derived from the seed, so a scene
+# can be regenerated anywhere without shipping video files, and the true boxes are known.
+
+
+class SyntheticScene:
+    def __init__(self, width=320, height=240, num_objects=6, seed=0, min_size=24, max_size=64,
+                 max_speed=4.0):
+        rng = np.random.default_rng(seed)
+        self.width = width
+        self.height = height
+        self.background = rng.integers(0, 96, size=(height, width, 3), dtype=np.uint8)
+        self.sizes = rng.integers(min_size, max_size + 1, size=(num_objects, 2))
+        self.start = rng.uniform(0, 1, size=(num_objects, 2)) * (
+            np.array([width, height]) - self.sizes)
+        self.velocity = rng.uniform(-max_speed, max_speed, size=(num_objects, 2))
+        self.textures = [rng.integers(96, 256, size=(h, w, 3), dtype=np.uint8)
+                         for w, h in self.sizes]
+
+    def positions(self, frame_index):
+        # reflect the straight-line motion into [0, span] on each axis
+        span = np.array([self.width, self.height]) - self.sizes
+        travel = np.abs(self.start + self.velocity * frame_index) % (2 * span)
+        return np.where(travel > span, 2 * span - travel, travel).astype(np.int64)
+
+    def boxes(self, frame_index):
+        # (N, 5) int32 [object_id, xmin, ymin, xmax, ymax]
+        xy = self.positions(frame_index)
+        ids = np.arange(len(xy))[:, None]
+        return np.hstack([ids, xy, xy + self.sizes]).astype(np.int32)
+
+    def frame(self, frame_index):
+        frame = self.background.copy()
+        for (_, xmin, ymin, xmax, ymax), texture in zip(self.boxes(frame_index), self.textures):
+            frame[ymin:ymax, xmin:xmax] = texture
+        return frame
+
+    def frames(self, num_frames):
+        return [self.frame(frame_index) for frame_index in range(num_frames)]
+
+
+def noisy_tracks(scene, num_frames, seed=0, jitter=2.0, miss_rate=0.05, switch_rate=0.001):
+    # tracker-like output for the scene: jittered boxes, dropped boxes and the occasional
+    # identity switch, which gives metrics something to count
+    rng = np.random.default_rng(seed)
+    relabel = np.arange(len(scene.sizes))
+    next_id = len(relabel)
+    hypotheses = []
+    for frame_index in range(num_frames):
+        boxes = scene.boxes(frame_index)
+        switched = rng.random(len(relabel)) < switch_rate
+        relabel[switched] = np.arange(next_id, next_id + switched.sum())
+        next_id += int(switched.sum())
+        boxes[:, 0] = relabel[boxes[:, 0]]
+        boxes[:, 1:] += np.round(rng.normal(0, jitter, size=(len(boxes), 4))).astype(np.int32)
+        hypotheses.append(boxes[rng.random(len(boxes)) >= miss_rate])
+    return hypotheses
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+# Correlation templates kept between frames, one per track. Each track owns a grow-only
+# float buffer and a refresh copies the new crop into it, so steady tracking does not
+# allocate; get() returns a view of the valid part of the buffer.
+class TemplateCache:
+    def __init__(self):
+        self.buffers = {}
+        self.shapes = {}
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __contains__(self, track_id):
+        return track_id in self.shapes
+
+    def get(self, track_id):
+        shape = self.shapes.get(track_id)
+        if shape is None:
+            return None
+        return self.buffers[track_id][:shape[0], :shape[1]]
+
+    def put(self, track_id, template):
+        h, w = template.shape
+        buffer = self.buffers.get(track_id)
+        if buffer is None or buffer.shape[0] < h or buffer.shape[1] < w:
+            old_h, old_w = (0, 0) if buffer is None else buffer.shape
+            buffer = self.buffers[track_id] = np.empty((max(h, old_h), max(w, old_w)), dtype=np.float64)
+        buffer[:h, :w] = template
+        self.shapes[track_id] = (h, w)
+
+    def discard(self, track_id):
+        # the buffer stays allocated for when the track gets a template again
+        self.shapes.pop(track_id, None)
+
+    def clear(self):
+        self.shapes.clear()
+
+    def retain(self, track_ids):
+        keep = {int(track_id) for track_id in track_ids}
+        for track_id in list(self.buffers):
+            if track_id not in keep:
+                del self.buffers[track_id]
+                self.shapes.pop(track_id, None)
+
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
@@ -0,0 +1,189 @@
+import numpy as np
+
+
+def box_centers(boxes):
+    return np.column_stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2])
+
+
+def box_sizes(boxes):
+    return np.column_stack([boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]]).astype(np.float64)
+
+
+# Keeps the last `capacity` frames of detections in a ring of rows plus the state of
+# every live track as parallel arrays (struct of arrays). Tracks not seen for
+# `capacity` frames are retired and their slots reused, so memory depends on the
+# window and the number of live tracks, not on how long the stream has been running.
+# With a motion model every track also carries a filtered center/velocity state, updated
+# for all tracks of a frame at once, from which boxes can be predicted for later frames.
+class TrackStore:
+    def __init__(self, capacity=80, row_capacity=256, track_capacity=64, motion=None):
+        self.capacity = capacity
+        self.motion = motion
+        self.frame_numbers = np.full(capacity, -1, dtype=np.int64)
+        self.frame_starts = np.zeros(capacity, dtype=np.int64)
+        self.frame_sizes = np.zeros(capacity, dtype=np.int64)
+        self.rows = np.zeros((row_capacity, 5), dtype=np.int32)
+        self.row_head = 0
+        self.frames_written = 0
+
+        self.slots = {}
+        self.free_slots = list(range(track_capacity - 1, -1, -1))
+        self.alive = np.zeros(track_capacity, dtype=bool)
+        self.track_ids = np.zeros(track_capacity, dtype=np.int64)
+        self.boxes = np.zeros((track_capacity, 4), dtype=np.int32)
+        self.first_seen = np.zeros(track_capacity, dtype=np.int64)
+        self.last_seen = np.zeros(track_capacity, dtype=np.int64)
+        self.last_detected = np.full(track_capacity, -1, dtype=np.int64)
+        self.velocity = np.zeros((track_capacity, 2), dtype=np.float64)
+        self.motion_state = np.zeros((track_capacity, 4), dtype=np.float64)
+        self.motion_cov = np.zeros((track_capacity, 4, 4), dtype=np.float64)
+        self.motion_frame = np.full(track_capacity, -1, dtype=np.int64)
+
+    def __len__(self):
+        return min(self.frames_written, self.capacity)
+
+    def oldest_row(self):
+        if self.frames_written <= self.capacity:
+            return 0
+        return self.frame_starts[self.frames_written % self.capacity]
+
+    def grow_rows(self, needed):
+        row_capacity = len(self.rows)
+        while row_capacity < needed:
+            row_capacity *= 2
+        positions = np.arange(self.oldest_row(), self.row_head)
+        rows = np.zeros((row_capacity, 5), dtype=np.int32)
+        rows[positions % row_capacity] = self.rows[positions % len(self.rows)]
+        self.rows = rows
+
+    def grow_tracks(self):
+        old_capacity = len(self.alive)
+        extra = old_capacity
+        self.free_slots = list(range(2 * old_capacity - 1, old_capacity - 1, -1)) + self.free_slots
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        self.track_ids = np.concatenate([self.track_ids, np.zeros(extra, dtype=np.int64)])
+        self.boxes = np.concatenate([self.boxes, np.zeros((extra, 4), dtype=np.int32)])
+        self.first_seen = np.concatenate([self.first_seen, np.zeros(extra, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros(extra, dtype=np.int64)])
+        self.last_detected = np.concatenate([self.last_detected, np.full(extra, -1, dtype=np.int64)])
+        self.velocity = np.concatenate([self.velocity, np.zeros((extra, 2), dtype=np.float64)])
+        self.motion_state = np.concatenate([self.motion_state, np.zeros((extra, 4), dtype=np.float64)])
+        self.motion_cov = np.concatenate([self.motion_cov, np.zeros((extra, 4, 4), dtype=np.float64)])
+        self.motion_frame = np.concatenate([self.motion_frame, np.full(extra, -1, dtype=np.int64)])
+
+    def frame(self, age=0):
+        # detections of the frame written `age` frames ago (0 is the latest)
+        if age >= len(self):
+            raise IndexError("frame is outside of the track store window")
+        slot = (self.frames_written - 1 - age) % self.capacity
+        start, size = self.frame_starts[slot], self.frame_sizes[slot]
+        return self.rows[np.arange(start, start + size) % len(self.rows)]
+
+    def history(self):
+        return [self.frame(age) for age in range(len(self) - 1, -1, -1)]
+
+    def append(self, frame_index, detections):
+        detections = np.asarray(detections, dtype=np.int32).reshape(-1, 5)
+        needed = self.row_head + len(detections) - self.oldest_row()
+        if needed > len(self.rows):
+            self.grow_rows(needed)
+        slot = self.frames_written % self.capacity
+        positions = np.arange(self.row_head, self.row_head + len(detections)) % len(self.rows)
+        self.rows[positions] = detections
+        self.frame_numbers[slot] = frame_index
+        self.frame_starts[slot] = self.row_head
+        self.frame_sizes[slot] = len(detections)
+        self.row_head += len(detections)
+        self.frames_written += 1
+
+        for detection in detections:
+            self.update_track(frame_index, int(detection[0]), detection[1:])
+        if self.motion is not None and len(detections):
+            self.update_motion(frame_index, detections)
+        self.retire(frame_index + 1)
+
+    def update_track(self, frame_index, track_id, box):
+        slot = self.slots.get(track_id)
+        if slot is None:
+            if not self.free_slots:
+                self.grow_tracks()
+            slot = self.free_slots.pop()
+            self.slots[track_id] = slot
+            self.alive[slot] = True
+            self.track_ids[slot] = track_id
+            self.first_seen[slot] = frame_index
+            self.last_detected[slot] = -1
+            self.velocity[slot] = 0
+            self.motion_frame[slot] = -1
+        elif frame_index > self.last_seen[slot]:
+            shift = box_centers(box[None]) - box_centers(self.boxes[slot][None])
+            self.velocity[slot] = shift[0] / (frame_index - self.last_seen[slot])
+        self.boxes[slot] = box
+        self.last_seen[slot] = frame_index
+
+    def update_motion(self, frame_index, detections):
+        slots = self.track_slots(detections[:, 0])
+        centers = box_centers(detections[:, 1:])
+        sizes = box_sizes(detections[:, 1:])
+        new = self.motion_frame[slots] < 0
+        if new.any():
+            self.motion_state[slots[new]], self.motion_cov[slots[new]] = self.motion.initiate(
+                centers[new], sizes[new])
+        old = ~new
+        if old.any():
+            tracked = slots[old]
+            state, covariance = self.motion.predict(self.motion_state[tracked], self.motion_cov[tracked],
+                                                    sizes[old], frame_index - self.motion_frame[tracked])
+            self.motion_state[tracked], self.motion_cov[tracked] = self.motion.update(
+                state, covariance, centers[old], sizes[old])
+        self.motion_frame[slots] = frame_index
+
+    def predict_centers(self, slots, frame_index):
+        # centers expected at frame_index; last seen centers for tracks without a motion state
+        centers = box_centers(self.boxes[slots])
+        if self.motion is None:
+            return centers
+        tracked = self.motion_frame[slots] >= 0
+        centers[tracked] = self.motion.project(self.motion_state[slots[tracked]],
+                                               frame_index - self.motion_frame[slots[tracked]])
+        return centers
+
+    def track_slots(self, track_ids):
+        return np.array([self.slots[int(track_id)] for track_id in track_ids], dtype=np.int64)
+
+    def mark_detected(self, track_ids, frame_index):
+        for track_id in track_ids:
+            slot = self.slots.get(int(track_id))
+            if slot is not None:
+                self.last_detected[slot] = frame_index
+
+    def retire(self, frame_index):
+        dead = np.flatnonzero(self.alive & (self.last_seen < frame_index - self.capacity))
+        for slot in dead:
+            del self.slots[int(self.track_ids[slot])]
+            self.alive[slot] = False
+            self.free_slots.append(slot)
+
+    def active(self, frame_index):
+        # live tracks seen in [frame_index - capacity, frame_index), ordered by track id
+        slots = np.flatnonzero(self.alive & (self.last_seen >= frame_index - self.capacity))
+        return slots[np.argsort(self.track_ids[slots], kind='stable')]
+
+    def active_detections(self, frame_index, predicted=False):
+        slots = self.active(frame_index)
+        boxes = self.boxes[slots]
+        if predicted and self.motion is not None:
+            sizes = box_sizes(boxes)
+            corners = np.round(self.predict_centers(slots, frame_index) - sizes / 2)
+            boxes = np.hstack([corners, corners + sizes])
+        return np.column_stack([self.track_ids[slots], boxes]).astype(np.int32)
+
+    def age(self, frame_index):
+        slots = self.active(frame_index)
+        return frame_index - self.first_seen[slots]
+
+    def nbytes(self):
+        arrays = (self.frame_numbers, self.frame_starts, self.frame_sizes, self.rows, self.alive,
+                  self.track_ids, self.boxes, self.first_seen, self.last_seen, self.last_detected,
+                  self.velocity, self.motion_state, self.motion_cov, self.motion_frame)
+        return sum(array.nbytes for array in arrays)
@@ -1,86 +1,158 @@
 import os
+import cv2
 import numpy as np
-from detection import detection_cast, draw_detections, extract_detections
-from metrics import iou_score
-from moviepy.editor import VideoFileClip
+from scipy.optimize import linear_sum_assignment
+from detection import detection_cast, draw_detections, extract_detections, scale_boxes
+from detection_provider import seek
+from frame_source import open_source
+from profiling import NULL_PROFILER
+from track_store import TrackStore
+from metrics import greedy_pairs, iou_matrix
+from motion import make_motion
+
+MATCHERS = ('greedy', 'hungarian')
 
 class Tracker:
-    def __init__(self, return_images=True, lookup_tail_size=80, labels=None):
+    def __init__(self, return_images=True, lookup_tail_size=80, labels=None,
+                 matcher='greedy', iou_threshold=0.3, detector=None, profiler=None, motion=None,
+                 process_scale=1.0):
+        if matcher not in MATCHERS:
+            raise ValueError(f"Unknown matcher {matcher!r}, expected one of {MATCHERS}")
         self.return_images = return_images
         self.frame_index = 0
         self.labels = labels
-        self.detection_history = []
-        self.last_detected = {}
+        self.motion = make_motion(motion)
+        self.store = TrackStore(capacity=lookup_tail_size, motion=self.motion)
         self.tracklet_count = 0
         self.lookup_tail_size = lookup_tail_size
+        self.matcher = matcher
+        self.iou_threshold = iou_threshold
+        self.detector = extract_detections if detector is None else detector
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        # tracking runs on frames resized by process_scale, results are in source pixels
+        self.process_scale = process_scale
 
     def new_label(self):
         self.tracklet_count += 1
         return self.tracklet_count - 1
 
+    def detect(self, frame, **kwargs):
+        seek(self.detector, self.frame_index)
+        detections = self.detector(frame, **kwargs)
+        if self.process_scale != 1.0 and getattr(self.detector, 'source_coordinates', False):
+            detections = scale_boxes(detections, self.process_scale)
+        return detections
+
     def init_tracklet(self, frame):
-        detections = extract_detections(frame)
+        with self.profiler.stage('extract_detections'):
+            detections = self.detect(frame)
         for detection in detections:
             detection[0] = self.new_label()
         return detection_cast(detections) 
 
+    @property
+    def detection_history(self):
+        return self.store.history()
+
+    @property
+    def last_detected(self):
+        slots = self.store.active(self.frame_index)
+        return {int(self.store.track_ids[slot]): int(self.store.last_detected[slot])
+                for slot in slots if self.store.last_detected[slot] >= 0}
+
     @property
     def prev_detections(self):
-        start_frame = max(0, self.frame_index - self.lookup_tail_size)
-        last_seen = {}
-        for frame_num in range(start_frame, self.frame_index):
-            frame_detections = self.detection_history[frame_num]
-            for detection in frame_detections:
-                tracklet_id = detection[0]
-                last_seen[tracklet_id] = detection
-        
-        return detection_cast(list(last_seen.values()))
+        # with a motion model the boxes are moved to where the tracks should be now
+        return self.store.active_detections(self.frame_index, predicted=True)
+
+    def match_greedy(self, iou):
+        matches = []
+        matched_curr = set()
+        matched_prev = set()
+        for _, curr_idx, prev_idx in greedy_pairs(iou, self.iou_threshold, inclusive=True):
+            if curr_idx in matched_curr or prev_idx in matched_prev:
+                continue
+            matches.append((curr_idx, prev_idx))
+            matched_curr.add(curr_idx)
+            matched_prev.add(prev_idx)
+        return matches
+
+    def match_hungarian(self, iou):
+        curr_indices, prev_indices = linear_sum_assignment(iou, maximize=True)
+        return [(curr_idx, prev_idx) for curr_idx, prev_idx in zip(curr_indices, prev_indices)
+                if iou[curr_idx, prev_idx] >= self.iou_threshold]
 
     def bind_tracklet(self, detections):
         detections = detections.copy()
         prev_detections = self.prev_detections
-        iou_list = []
-        for curr_idx, curr_det in enumerate(detections):
-            for prev_idx, prev_det in enumerate(prev_detections):
-                iou = iou_score(curr_det[1:], prev_det[1:])
-                iou_list.append((iou, curr_idx, prev_idx, prev_det[0]))
-        iou_list.sort(reverse=True, key=lambda x: x[0])
+        iou = iou_matrix(detections[:, 1:], prev_detections[:, 1:])
+        if self.matcher == 'hungarian':
+            matches = self.match_hungarian(iou)
+        else:
+            matches = self.match_greedy(iou)
         matched_curr = set()
-        matched_prev = set()
-        iou_threshold = 0.3
-        for iou_value, curr_idx, prev_idx, prev_tracklet_id in iou_list:
-            if curr_idx in matched_curr or prev_tracklet_id in matched_prev:
-                continue
-            if iou_value < iou_threshold:
-                break
-            detections[curr_idx, 0] = prev_tracklet_id
+        for curr_idx, prev_idx in matches:
+            detections[curr_idx, 0] = prev_detections[prev_idx, 0]
             matched_curr.add(curr_idx)
-            matched_prev.add(prev_tracklet_id)
         for curr_idx in range(len(detections)):
             if curr_idx not in matched_curr:
                 detections[curr_idx, 0] = self.new_label()
         return detection_cast(detections)
     
+    def append_history(self, detections):
+        self.store.append(self.frame_index, detections)
+
     def save_detections(self, detections):
-        for label in detections[:, 0]:
-            self.last_detected[label] = self.frame_index
+        self.store.mark_detected(detections[:, 0], self.frame_index)
 
-    def update_frame(self, frame):
+    def process_frame(self, frame):
         if not self.frame_index:
             detections = self.init_tracklet(frame)
         else:
-            detections = extract_detections(frame, labels=self.labels)
-            detections = self.bind_tracklet(detections)
+            with self.profiler.stage('extract_detections'):
+                detections = self.detect(frame, labels=self.labels)
+            with self.profiler.stage('bind_tracklet'):
+                detections = self.bind_tracklet(detections)
+        self.append_history(detections)
         self.save_detections(detections)
-        self.detection_history.append(detections)
+        self.profiler.count('detector_frames')
+        return detections
+
+    def prepare_frame(self, frame):
+        if self.process_scale == 1.0 or not isinstance(frame, np.ndarray):
+            return frame
+        with self.profiler.stage('resize'):
+            height, width = frame.shape[:2]
+            size = (max(1, int(round(width * self.process_scale))),
+                    max(1, int(round(height * self.process_scale))))
+            return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def to_source(self, detections):
+        if self.process_scale == 1.0:
+            return detections
+        return scale_boxes(detections, 1 / self.process_scale)
+
+    def update_frame(self, frame, prepared=None):
+        # prepared: frame already resized by prepare_frame, e.g. in a pipeline stage
+        with self.profiler.stage('update_frame'):
+            if prepared is None:
+                prepared = self.prepare_frame(frame)
+            detections = self.to_source(self.process_frame(prepared))
+        self.profiler.observe('tracks', len(detections))
         self.frame_index += 1
         if self.return_images:
-            return draw_detections(frame, detections)
+            with self.profiler.stage('draw_detections'):
+                return draw_detections(frame, detections)
         else:
             return detections
 
+    def track(self, source):
+        for frame in open_source(source):
+            yield self.update_frame(frame)
+
 
 def main():
+    from moviepy.editor import VideoFileClip
     dirname = os.path.dirname(__file__)
     input_path = os.path.join(dirname, "data", "test.mp4")
     output_path = os.path.join(dirname, "data", "test_result.mp4")